@@ -0,0 +1,96 @@
+"""async_crud.py"""
+
+# sqlmodel's AsyncSession.exec is mistyped in 0.0.8, so these use
+# SQLAlchemy's execute().scalars() with explicit result annotations.
+
+from typing import Optional, List, Sequence
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db.models import (User, Instrument, UserInstrumentLink,
+                       UserListingMatch)
+
+
+async def get_user_by_email(email_address: str,
+                            engine: AsyncEngine) -> Optional[User]:
+    """Get User object by email address."""
+    async with AsyncSession(engine) as session:
+        stmt = select(User).where(User.email == email_address)
+        user: Optional[User] = (await session.execute(stmt)).scalars().first()
+
+    return user
+
+
+async def get_instrument_by_id(instrument_id: int,
+                               engine: AsyncEngine) -> Optional[Instrument]:
+    """Get Instrument object by id."""
+    async with AsyncSession(engine) as session:
+        stmt = select(Instrument).where(Instrument.id == instrument_id)
+        instrument: Optional[Instrument] = (
+            (await session.execute(stmt)).scalars().first())
+
+    return instrument
+
+
+async def update_user_instruments(user: User,
+                                  instrument: Instrument,
+                                  engine: AsyncEngine) -> None:
+    """Update a Users instruments."""
+    await add_user_instruments(user, [instrument], engine)
+
+
+async def add_user_instruments(user: User,
+                               instruments: Sequence[Instrument],
+                               engine: AsyncEngine) -> None:
+    """Add many Instruments to a User in a single transaction."""
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add_all(instruments)
+        await session.flush()
+        session.add_all([UserInstrumentLink(user_id=user.id,
+                                            instrument_id=i.id)
+                         for i in instruments])
+        await session.commit()
+
+
+async def get_user_instruments(user: User,
+                               engine: AsyncEngine) -> List[Instrument]:
+    """Get a Users Instrument Objects."""
+    async with AsyncSession(engine) as session:
+        stmt = (select(Instrument)
+                .join(UserInstrumentLink)
+                .join(User)
+                .where(User.id == user.id))
+        instruments: List[Instrument] = list(
+            (await session.execute(stmt)).scalars())
+
+    return instruments
+
+
+async def get_user_feed(user: User,
+                        engine: AsyncEngine,
+                        limit: int = 50,
+                        before_id: Optional[int] = None
+                        ) -> List[UserListingMatch]:
+    """Get a page of a Users listing matches, newest first. Pass the id
+    of the last match on a page as before_id to get the next page."""
+    async with AsyncSession(engine) as session:
+        stmt = select(UserListingMatch).where(
+            UserListingMatch.user_id == user.id)
+        if before_id is not None:
+            stmt = stmt.where(col(UserListingMatch.id) < before_id)
+        stmt = stmt.order_by(col(UserListingMatch.id).desc()).limit(limit)
+        matches: List[UserListingMatch] = list(
+            (await session.execute(stmt)).scalars())
+
+    return matches
+
+
+async def delete_user_by_email(email: str,
+                               engine: AsyncEngine) -> None:
+    """Delete a User using their email addres."""
+    async with AsyncSession(engine) as session:
+        stmt = select(User).where(User.email == email)
+        user = (await session.execute(stmt)).scalars().first()
+        if user:
+            await session.delete(user)
+            await session.commit()
@@ -0,0 +1,174 @@
+"""benchmark.py"""
+
+import argparse
+import asyncio
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.future.engine import Engine
+from sqlmodel import Session, SQLModel, create_engine
+from db import async_crud, crud
+from db.models import Instrument, User
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def populate(engine: Engine, users: int, instruments: int) -> List[str]:
+    """Create users with instruments and return their email addresses."""
+    emails = [f"user{i}@bench.test" for i in range(users)]
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        for email in emails:
+            session.add(User(email=email, active=True, date_created=now,
+                             instruments=[Instrument(type="electric_guitar",
+                                                     make=f"Make{i}",
+                                                     model=f"Model{i}",
+                                                     date_created=now)
+                                          for i in range(instruments)]))
+        session.commit()
+    return emails
+
+
+def run_sync(engine: Engine, emails: List[str]) -> float:
+    """Look up every user and their instruments one after another,
+    returning the elapsed time."""
+    start = perf_counter()
+    for email in emails:
+        user = crud.get_user_by_email(email, engine)
+        if user:
+            crud.get_user_instruments(user, engine)
+    return perf_counter() - start
+
+
+async def run_async(engine: AsyncEngine,
+                    emails: List[str],
+                    concurrency: int) -> float:
+    """Look up every user and their instruments with up to concurrency
+    lookups in flight, returning the elapsed time."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lookup(email: str) -> None:
+        async with semaphore:
+            user = await async_crud.get_user_by_email(email, engine)
+            if user:
+                await async_crud.get_user_instruments(user, engine)
+
+    start = perf_counter()
+    await asyncio.gather(*(lookup(i) for i in emails))
+    return perf_counter() - start
+
+
+def async_url(sync_url: str) -> str:
+    """
+    Derive the async driver url for a synchronous database url.
+
+    Raises:
+        ValueError: If there is no known async driver for the url.
+    """
+    url = make_url(sync_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {backend}, "
+                         "pass --async-url")
+    query = dict(url.query)
+    if backend == "postgresql" and "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return str(url.set(drivername=ASYNC_DRIVERS[backend], query=query))
+
+
+def run_benchmark(sync_url: str,
+                  async_url: str,
+                  users: int = 200,
+                  instruments: int = 3,
+                  concurrency: int = 10,
+                  setup: bool = True) -> Dict[str, float]:
+    """
+    Compare user/instrument lookups through db.crud and db.async_crud.
+
+    Args:
+        sync_url (str): Database url for the synchronous engine.
+        async_url (str): Url of the same database for the async engine.
+        users (int): Number of users to look up.
+        instruments (int): Instruments per user.
+        concurrency (int): Async lookups in flight at once.
+        setup (bool): Create tables and populate test users first.
+
+    Returns:
+        Dict[str, float]: Elapsed seconds and lookups per second for
+            each path.
+    """
+    engine = create_engine(sync_url)
+    if setup:
+        SQLModel.metadata.create_all(engine)
+        emails = populate(engine, users, instruments)
+    else:
+        emails = [f"user{i}@bench.test" for i in range(users)]
+
+    sync_elapsed = run_sync(engine, emails)
+    engine.dispose()
+
+    async def run() -> float:
+        # SQLite uses a NullPool, which takes no sizing arguments.
+        pool: Dict[str, int] = ({} if async_url.startswith("sqlite") else
+                                {"pool_size": concurrency})
+        async_engine = create_async_engine(async_url, **pool)
+        try:
+            return await run_async(async_engine, emails, concurrency)
+        finally:
+            await async_engine.dispose()
+
+    async_elapsed = asyncio.run(run())
+    return {
+        "sync_seconds": sync_elapsed,
+        "sync_lookups_per_second": len(emails) / sync_elapsed,
+        "async_seconds": async_elapsed,
+        "async_lookups_per_second": len(emails) / async_elapsed,
+    }
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark db.crud against db.async_crud.")
+    parser.add_argument("--sync-url",
+                        help="Defaults to a temporary SQLite database.")
+    parser.add_argument("--async-url",
+                        help="Defaults to --sync-url with its async "
+                             "driver.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--instruments", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--no-setup", action="store_true",
+                        help="Benchmark existing bench users only.")
+    args = parser.parse_args()
+
+    directory: Optional[tempfile.TemporaryDirectory[str]] = None
+    if args.sync_url is None:
+        if args.async_url is not None:
+            parser.error("--async-url requires --sync-url")
+        directory = tempfile.TemporaryDirectory()
+        args.sync_url = f"sqlite:///{Path(directory.name) / 'bench.db'}"
+    if args.async_url is None:
+        try:
+            args.async_url = async_url(args.sync_url)
+        except ValueError as err:
+            parser.error(str(err))
+
+    results = run_benchmark(args.sync_url, args.async_url, args.users,
+                            args.instruments, args.concurrency,
+                            not args.no_setup)
+    for name, value in results.items():
+        print(f"{name}: {value:.3f}")
+    if directory:
+        directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,9 @@
 
 from typing import Optional, List
 from sqlalchemy.future.engine import Engine
-from sqlmodel import Session, select
-from db.models import User, Instrument, UserInstrumentLink
+from sqlmodel import Session, col, select
+from db.models import (User, Instrument, UserInstrumentLink,
+                       UserListingMatch)
 
 
 def get_user_by_email(email_address: str,
@@ -53,6 +54,23 @@ def get_user_instruments(user: User,
     return instruments
 
 
+def get_user_feed(user: User,
+                  engine: Engine,
+                  limit: int = 50,
+                  before_id: Optional[int] = None) -> List[UserListingMatch]:
+    """Get a page of a Users listing matches, newest first. Pass the id
+    of the last match on a page as before_id to get the next page."""
+    with Session(engine) as session:
+        stmt = select(UserListingMatch).where(
+            UserListingMatch.user_id == user.id)
+        if before_id is not None:
+            stmt = stmt.where(col(UserListingMatch.id) < before_id)
+        stmt = stmt.order_by(col(UserListingMatch.id).desc()).limit(limit)
+        matches = list(session.exec(stmt))
+
+    return matches
+
+
 def delete_user_by_email(email: str,
                          engine: Engine) -> None:
     """Delete a User using their email addres."""
@@ -1,7 +1,9 @@
 """database.py"""
 
 from os import getenv
+from typing import Optional
 from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import SQLModel, create_engine
 
 load_dotenv()
@@ -9,7 +11,34 @@ load_dotenv()
 POSTGRES = f"postgresql://{getenv('database')}?sslmode=require"
 engine = create_engine(POSTGRES, echo=False)
 
+ASYNC_POSTGRES = f"postgresql+asyncpg://{getenv('database')}?ssl=require"
+_async_engine: Optional[AsyncEngine] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """Return the shared async engine, creating it on first use so
+    synchronous consumers do not need asyncpg or a second pool."""
+    global _async_engine  # pylint: disable=global-statement
+    if _async_engine is None:
+        _async_engine = create_async_engine(ASYNC_POSTGRES, echo=False,
+                                            pool_size=10, max_overflow=20,
+                                            pool_pre_ping=True)
+    return _async_engine
+
 
 def create_db_and_tables() -> None:
-    """Create database and tables."""
+    """Create database and tables, and any indexes added to tables
+    that already exist."""
     SQLModel.metadata.create_all(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+async def create_db_and_tables_async() -> None:
+    """Create database and tables using the async engine."""
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                await conn.run_sync(index.create, checkfirst=True)
@@ -2,12 +2,15 @@
 
 from datetime import datetime
 from typing import Optional, List
+from sqlalchemy import (Column, ForeignKey, Index, Integer, Text,
+                        UniqueConstraint, text)
 from sqlmodel import Field, SQLModel, Relationship
 
 
 class UserInstrumentLink(SQLModel, table=True):
     """Link table for many-to-many user/instrument
     relationships."""
+    __table_args__ = (Index("ix_userinstrumentlink_user_id", "user_id"),)
     instrument_id: Optional[int] = Field(
         default=None, foreign_key="instrument.id", primary_key=True
     )
@@ -18,6 +21,9 @@ class UserInstrumentLink(SQLModel, table=True):
 
 class Instrument(SQLModel, table=True):
     """Instrument table."""
+    __table_args__ = (
+        Index("ix_instrument_type_lower_make", "type", text("lower(make)")),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     type: str
     make: str
@@ -37,3 +43,47 @@ class User(SQLModel, table=True):
         back_populates="users",
         link_model=UserInstrumentLink
     )
+
+
+class CrawlTask(SQLModel, table=True):
+    """Crawl work queue table. One row per (crawl, category, page)
+    with its lease and, once done, the page's listings as JSON."""
+    __table_args__ = (UniqueConstraint("crawl_id", "instrument", "page"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    crawl_id: str = Field(index=True)
+    instrument: str
+    page: int
+    status: str = Field(default="pending", index=True)
+    worker_id: Optional[str] = None
+    lease_expires: Optional[datetime] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[str] = Field(default=None, sa_column=Column(Text))
+    date_created: datetime
+    date_completed: Optional[datetime] = None
+
+
+class UserListingMatch(SQLModel, table=True):
+    """Materialized feed of scraped listings matching a User's
+    Instruments. Rows are appended after each crawl and read newest
+    first with keyset pagination on (user_id, id)."""
+    __table_args__ = (
+        UniqueConstraint("user_id", "listing_id"),
+        Index("ix_userlistingmatch_user_id_id", "user_id", "id"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(sa_column=Column(
+        Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False))
+    instrument_id: int = Field(sa_column=Column(
+        Integer, ForeignKey("instrument.id", ondelete="CASCADE"),
+        nullable=False))
+    listing_id: int
+    crawl_id: Optional[str] = None
+    title: str
+    make: str
+    model: str
+    slug: str
+    price_cents: int
+    currency: str
+    published_at: datetime
+    date_created: datetime
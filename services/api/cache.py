@@ -0,0 +1,66 @@
+"""cache.py"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class ResultCache(Generic[T]):
+    """
+    Thread safe in-process LRU cache with a per entry time to live.
+
+    Args:
+        maxsize (int): Maximum number of entries held before the least
+            recently used entry is evicted. Defaults to 256.
+        ttl (float): Seconds an entry stays valid after it is stored.
+            Defaults to 60.
+        clock (Callable[[], float]): Monotonic time source. Defaults to
+            time.monotonic, overridable for testing.
+    """
+
+    def __init__(self,
+                 maxsize: int = 256,
+                 ttl: float = 60.0,
+                 clock: Callable[[], float] = monotonic) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be a positive integer")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, T]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[T]:
+        """Return the cached value for key, or None if it is missing
+        or has expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: T) -> None:
+        """Store value under key, evicting the least recently used
+        entry if the cache is full."""
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,119 @@
+"""load_test.py"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import local
+from time import perf_counter
+from typing import List, Sequence
+import requests
+
+_session = local()
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """
+    Return the pct percentile of samples using linear interpolation.
+
+    Args:
+        samples (Sequence[float]): Observed values.
+        pct (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The interpolated percentile, or 0.0 if samples is empty.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+@dataclass
+class LoadTestReport:
+    """Summary of a load test run. Latencies are in seconds."""
+    requests: int
+    errors: int
+    elapsed: float
+    latencies: List[float]
+
+    @property
+    def requests_per_second(self) -> float:
+        """Completed requests per second of wall clock time."""
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        lines = [
+            f"requests:  {self.requests}",
+            f"errors:    {self.errors}",
+            f"elapsed:   {self.elapsed:.3f}s",
+            f"req/s:     {self.requests_per_second:.1f}",
+        ]
+        for pct in (50, 90, 99):
+            millis = percentile(self.latencies, pct) * 1000
+            lines.append(f"p{pct}:{' ' * (7 - len(str(pct)))}{millis:.2f}ms")
+        return "\n".join(lines)
+
+
+def _fetch(url: str) -> float:
+    """GET url on a per thread session and return the latency, or a
+    negative value if the request failed."""
+    if not hasattr(_session, "session"):
+        _session.session = requests.Session()
+    start = perf_counter()
+    try:
+        response = _session.session.get(url, timeout=60)
+        ok = response.status_code < 400
+    except requests.RequestException:
+        ok = False
+    latency = perf_counter() - start
+    return latency if ok else -latency
+
+
+def run_load_test(urls: Sequence[str],
+                  total: int,
+                  concurrency: int) -> LoadTestReport:
+    """
+    Issue total GET requests, cycling through urls, from concurrency
+    worker threads.
+
+    Args:
+        urls (Sequence[str]): Urls to request in round robin order.
+        total (int): Number of requests to make.
+        concurrency (int): Number of concurrent clients.
+
+    Returns:
+        LoadTestReport: Throughput and latency summary.
+    """
+    targets = [urls[i % len(urls)] for i in range(total)]
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(_fetch, targets))
+    elapsed = perf_counter() - start
+    return LoadTestReport(requests=total,
+                          errors=sum(1 for i in results if i < 0),
+                          elapsed=elapsed,
+                          latencies=[abs(i) for i in results])
+
+
+def main() -> None:
+    """Run a load test from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Load test the listing search service.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("-n", "--requests", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("paths", nargs="*",
+                        default=["/listings",
+                                 "/listings?make=Fender",
+                                 "/listings?make=Gibson&page=2",
+                                 "/listings?q=les+paul&per_page=10"])
+    args = parser.parse_args()
+    urls = [args.base_url.rstrip("/") + i for i in args.paths]
+    print(run_load_test(urls, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""search.py"""
+
+import json
+from json import JSONDecodeError
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from services.scrapers.reverb.reverb import category_uuids
+from services.scrapers.reverb.reverb_models import Listing
+
+MAX_PER_PAGE = 100
+
+Snapshot = Tuple[Tuple[str, int, int], ...]
+
+
+def _one(params: Dict[str, List[str]], name: str) -> Optional[str]:
+    """Return the last non-empty value of a query parameter."""
+    values = [i for i in params.get(name, []) if i]
+    return values[-1] if values else None
+
+
+def _int(params: Dict[str, List[str]], name: str,
+         default: Optional[int] = None,
+         minimum: int = 0) -> Optional[int]:
+    """Parse an integer query parameter."""
+    value = _one(params, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError as err:
+        raise ValueError(f"{name} must be an integer") from err
+    if number < minimum:
+        raise ValueError(f"{name} must be >= {minimum}")
+    return number
+
+
+@dataclass(frozen=True)
+class ListingQuery:
+    """Filters and pagination for a listing search. String filters
+    are case insensitive, prices are in cents."""
+    make: Optional[str] = None
+    model: Optional[str] = None
+    condition: Optional[str] = None
+    category: Optional[str] = None
+    text: Optional[str] = None
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    page: int = 1
+    per_page: int = 50
+
+    @classmethod
+    def from_params(cls, params: Dict[str, List[str]]) -> "ListingQuery":
+        """
+        Build a query from parsed URL query parameters.
+
+        Args:
+            params (Dict[str, List[str]]): Output of urllib.parse.parse_qs.
+
+        Returns:
+            ListingQuery: The validated query.
+
+        Raises:
+            ValueError: If a parameter is malformed or out of range.
+        """
+        category = _one(params, "category")
+        if category is not None and category not in category_uuids:
+            raise ValueError(f"Unknown category: {category}")
+        per_page = _int(params, "per_page", 50, 1) or 50
+        return cls(
+            make=_one(params, "make"),
+            model=_one(params, "model"),
+            condition=_one(params, "condition"),
+            category=category,
+            text=_one(params, "q"),
+            min_price=_int(params, "min_price"),
+            max_price=_int(params, "max_price"),
+            page=_int(params, "page", 1, 1) or 1,
+            per_page=min(per_page, MAX_PER_PAGE),
+        )
+
+    def matches(self, listing: Listing) -> bool:
+        """Return True if listing satisfies every filter."""
+        checks = (
+            (self.make, listing.make),
+            (self.model, listing.model),
+            (self.condition, listing.condition_slug),
+        )
+        for wanted, actual in checks:
+            if wanted is not None and wanted.lower() != actual.lower():
+                return False
+        if (self.category is not None and
+                category_uuids[self.category] not in listing.category_uuids):
+            return False
+        if (self.text is not None and
+                self.text.lower() not in listing.title.lower()):
+            return False
+        cents = listing.price.amount_cents
+        if self.min_price is not None and cents < self.min_price:
+            return False
+        if self.max_price is not None and cents > self.max_price:
+            return False
+        return True
+
+
+@dataclass
+class ListingPage:
+    """A single page of search results."""
+    page: int
+    per_page: int
+    total: int
+    listings: List[Listing] = field(default_factory=list)
+
+    @property
+    def total_pages(self) -> int:
+        """Number of pages available for the query."""
+        return max(1, -(-self.total // self.per_page))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON serializable representation of the page."""
+        return {
+            "page": self.page,
+            "per_page": self.per_page,
+            "total": self.total,
+            "total_pages": self.total_pages,
+            "results": [i.dict() for i in self.listings],
+        }
+
+
+class ListingStore:
+    """
+    Read only view over the reverb_*.json crawl dumps in a directory.
+
+    The store tracks a snapshot of the dump files (name, mtime and size)
+    and reloads the listings whenever a new crawl lands. A snapshot that
+    cannot be loaded, such as a dump the scraper is still writing, is
+    skipped and the previous listings keep being served until the files
+    change again.
+
+    Args:
+        dump_dir (Path): Directory the scraper writes its dumps to.
+    """
+
+    def __init__(self, dump_dir: Path) -> None:
+        self.dump_dir = dump_dir
+        self._lock = Lock()
+        self._snapshot: Optional[Snapshot] = None
+        self._failed: Optional[Snapshot] = None
+        self._listings: List[Listing] = []
+
+    def current_snapshot(self) -> Snapshot:
+        """Return the identity of the dump files currently on disk."""
+        snapshot = []
+        for path in sorted(self.dump_dir.glob("reverb_*.json")):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            snapshot.append((path.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(snapshot)
+
+    @property
+    def snapshot(self) -> Optional[Snapshot]:
+        """Snapshot of the currently loaded listings."""
+        return self._snapshot
+
+    def refresh(self) -> bool:
+        """
+        Reload the listings if the dumps on disk have changed.
+
+        Returns:
+            bool: True if a new snapshot was loaded.
+        """
+        snapshot = self.current_snapshot()
+        if snapshot in (self._snapshot, self._failed):
+            return False
+        with self._lock:
+            if snapshot in (self._snapshot, self._failed):
+                return False
+            try:
+                listings = self._load(snapshot)
+            except (OSError, TypeError, JSONDecodeError, ValidationError):
+                self._failed = snapshot
+                return False
+            self._failed = None
+            self._listings = sorted(
+                listings.values(),
+                key=lambda listing: (
+                    datetime.strptime(listing.published_at,
+                                      "%Y-%m-%dT%H:%M:%S%z"),
+                    listing.id),
+                reverse=True)
+            self._snapshot = snapshot
+        return True
+
+    def _load(self, snapshot: Snapshot) -> Dict[int, Listing]:
+        """Read and validate every listing in the snapshot's dumps."""
+        listings: Dict[int, Listing] = {}
+        for name, _, _ in snapshot:
+            with open(self.dump_dir / name, "r", encoding="utf-8") as infile:
+                for i in json.load(infile):
+                    listing = Listing(**i)
+                    listings[listing.id] = listing
+        return listings
+
+    def search(self, query: ListingQuery) -> ListingPage:
+        """Return the requested page of listings matching query, newest
+        first."""
+        matched = [i for i in self._listings if query.matches(i)]
+        start = (query.page - 1) * query.per_page
+        return ListingPage(page=query.page,
+                           per_page=query.per_page,
+                           total=len(matched),
+                           listings=matched[start:start + query.per_page])
@@ -0,0 +1,197 @@
+"""server.py"""
+
+import argparse
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.future.engine import Engine
+from db.crud import get_user_by_email, get_user_instruments
+from .cache import ResultCache
+from .search import ListingQuery, ListingStore
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A serialized response body and its entity tag."""
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_data(cls, data: Any) -> "CachedResponse":
+        """Serialize data to JSON and compute its entity tag."""
+        body = json.dumps(data, default=_json_default).encode("utf-8")
+        return cls(body, f'"{hashlib.sha1(body).hexdigest()}"')
+
+
+def _json_default(value: Any) -> Any:
+    """JSON encoder fallback for datetimes and pydantic dataclasses."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value.__dict__
+
+
+class SearchServer(ThreadingHTTPServer):
+    """
+    HTTP server exposing listing search and user instruments.
+
+    Args:
+        address (Tuple[str, int]): Host and port to bind to.
+        store (ListingStore): Crawl dumps to search.
+        engine (Optional[Engine]): Database engine for user lookups.
+            If None, the user endpoints respond with 503.
+        cache (Optional[ResultCache[CachedResponse]]): Listing search
+            result cache. Defaults to a 256 entry, 60 second cache.
+    """
+    daemon_threads = True
+
+    def __init__(self,
+                 address: Tuple[str, int],
+                 store: ListingStore,
+                 engine: Optional[Engine] = None,
+                 cache: Optional["ResultCache[CachedResponse]"] = None
+                 ) -> None:
+        super().__init__(address, SearchRequestHandler)
+        self.store = store
+        self.engine = engine
+        self.cache: ResultCache[CachedResponse] = (
+            cache if cache is not None else ResultCache())
+        self.store.refresh()
+
+    def search_listings(self, query: ListingQuery) -> CachedResponse:
+        """Return the serialized search results for query, from the
+        cache when possible. A new crawl snapshot invalidates the
+        cache."""
+        if self.store.refresh():
+            self.cache.clear()
+        key = ("listings", self.store.snapshot, query)
+        response = self.cache.get(key)
+        if response is None:
+            page = self.store.search(query)
+            response = CachedResponse.from_data(page.to_dict())
+            self.cache.put(key, response)
+        return response
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """Route GET requests to the search server.
+
+    GET /listings?make=&model=&condition=&category=&q=
+                 &min_price=&max_price=&page=&per_page=
+    GET /users/<email>/instruments
+    """
+    server: SearchServer
+    protocol_version = "HTTP/1.1"
+
+    # pylint: disable=invalid-name
+    def do_GET(self) -> None:
+        """Handle a GET request."""
+        url = urlsplit(self.path)
+        parts = [unquote(i) for i in url.path.split("/") if i]
+
+        if parts == ["listings"]:
+            try:
+                query = ListingQuery.from_params(parse_qs(url.query))
+            except ValueError as err:
+                self._send_error(HTTPStatus.BAD_REQUEST, str(err))
+                return
+            self._send(self.server.search_listings(query))
+        elif len(parts) == 3 and parts[0] == "users" \
+                and parts[2] == "instruments":
+            self._user_instruments(parts[1])
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, "Not found")
+
+    def _user_instruments(self, email: str) -> None:
+        """Respond with the instruments a user is searching for."""
+        if self.server.engine is None:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE,
+                             "Database is not configured")
+            return
+        try:
+            user = get_user_by_email(email, self.server.engine)
+            instruments = (get_user_instruments(user, self.server.engine)
+                           if user else [])
+        except SQLAlchemyError:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE,
+                             "Database is unavailable")
+            return
+        if user is None:
+            self._send_error(HTTPStatus.NOT_FOUND, "User not found")
+            return
+        self._send(CachedResponse.from_data(
+            {"results": [i.dict() for i in instruments]}))
+
+    def _send(self, response: CachedResponse) -> None:
+        """Send a JSON response, or 304 if the client already has it."""
+        etag = response.etag
+        if_none_match = self.headers.get("If-None-Match", "")
+        if etag in (i.strip() for i in if_none_match.split(",")):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response.body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(response.body)
+
+    def _send_error(self, status: HTTPStatus, message: str) -> None:
+        """Send a JSON error response."""
+        body = json.dumps({"error": message}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # pylint: disable=redefined-builtin
+    def log_message(self, format: str, *args: Any) -> None:
+        """Silence per request logging."""
+
+
+def main() -> None:
+    """Run the search service from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Serve listing search and user instruments over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--dumps", type=Path,
+                        default=(Path(__file__).parent.parent /
+                                 "scrapers" / "reverb" / "dumps"))
+    parser.add_argument("--cache-size", type=int, default=256)
+    parser.add_argument("--cache-ttl", type=float, default=60.0)
+    parser.add_argument("--no-db", action="store_true",
+                        help="Do not connect to the user database.")
+    args = parser.parse_args()
+
+    engine: Optional[Engine] = None
+    if not args.no_db:
+        # pylint: disable=import-outside-toplevel
+        from db import database
+        engine = database.engine
+
+    server = SearchServer((args.host, args.port),
+                          ListingStore(args.dumps),
+                          engine,
+                          ResultCache(args.cache_size, args.cache_ttl))
+    print(f"Serving on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""compact.py"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from array import array
+from dataclasses import asdict, is_dataclass
+from pathlib import Path
+from typing import (Any, Callable, Dict, Hashable, Iterable, Iterator, List,
+                    Optional, Tuple)
+from .reverb_models import Listing, Photo
+
+# Flattened listing fields grouped by how they are stored. Dotted names
+# address nested dataclass fields.
+INT_FIELDS = ("id", "inventory", "price.amount_cents",
+              "buyer_price.amount_cents", "buyer_price.tax_included_rate",
+              "shipping.us_rate.amount_cents")
+BOOL_FIELDS = ("has_inventory", "offers_enabled", "auction",
+               "buyer_price.tax_included", "shipping.local", "shipping.us")
+CODED_FIELDS = ("make", "year", "finish", "shop_name", "condition",
+                "condition_uuid", "condition_slug", "listing_currency",
+                "category_uuids", "price.currency", "price.symbol",
+                "buyer_price.currency", "buyer_price.symbol",
+                "buyer_price.tax_included_hint", "state.slug",
+                "state.description", "shipping.us_rate.currency",
+                "shipping.us_rate.symbol")
+TEXT_FIELDS = ("model", "title", "created_at", "published_at",
+               "description", "slug", "sku")
+PRICE_FIELDS = ("price", "buyer_price", "shipping.us_rate")
+PHOTO_LINKS = ("large_crop", "small_crop", "full", "thumbnail")
+
+NO_RATE = -1
+
+
+# pylint: disable=unused-argument
+def _amount(cents: int, symbol: str) -> str:
+    """Canonical reverb.com price amount for cents."""
+    return f"{cents / 100:.2f}"
+
+
+def _display(cents: int, symbol: str) -> str:
+    """Canonical reverb.com display price for cents."""
+    whole, fraction = divmod(cents, 100)
+    if fraction:
+        return f"{symbol}{whole:,}.{fraction:02d}"
+    return f"{symbol}{whole:,}"
+
+
+DERIVED: Dict[str, Callable[[int, str], str]] = {
+    "amount": _amount,
+    "display": _display,
+}
+
+
+class InternTable:
+    """Dictionary encoding of repeated hashable values to integer
+    codes."""
+    __slots__ = ("values", "codes")
+
+    def __init__(self) -> None:
+        self.values: List[Hashable] = []
+        self.codes: Dict[Hashable, int] = {}
+
+    def encode(self, value: Hashable) -> int:
+        """Return the code for value, assigning a new one if needed."""
+        code = self.codes.get(value)
+        if code is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def decode(self, code: int) -> Any:
+        """Return the value for code."""
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def _flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Flatten nested listing dictionaries to dotted field names."""
+    flat: Dict[str, Any] = {}
+    for key, value in data.items():
+        if is_dataclass(value) and not isinstance(value, type):
+            value = asdict(value)
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _nest(flat: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of _flatten."""
+    data: Dict[str, Any] = {}
+    for key, value in flat.items():
+        *parents, name = key.split(".")
+        node = data
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[name] = value
+    return data
+
+
+class CompactListings:
+    """
+    Column oriented, memory compact store of reverb.com listings.
+
+    Numbers and flags live in typed arrays, prices are kept as integer
+    cents, and low cardinality strings are dictionary encoded into
+    shared InternTables so each distinct value is held once. Price
+    amount and display strings are rebuilt from the cents, with the
+    rare value that does not match the canonical format (e.g. "FREE")
+    kept in a sparse override map, so conversion back to Listing is
+    lossless.
+
+    Args:
+        listings (Iterable[reverb_models.Listing]): Initial listings.
+    """
+
+    def __init__(self, listings: Iterable[Listing] = ()) -> None:
+        self._ints = {i: array("q") for i in INT_FIELDS}
+        self._bools = {i: array("b") for i in BOOL_FIELDS}
+        self._codes = {i: array("I") for i in CODED_FIELDS}
+        self._tables = {i: InternTable() for i in CODED_FIELDS}
+        self._texts: Dict[str, List[Optional[str]]] = {
+            i: [] for i in TEXT_FIELDS}
+        self._photos: List[Tuple[Optional[str], ...]] = []
+        self._overrides: Dict[str, Dict[int, str]] = {}
+        self._hrefs = InternTable()
+        self.extend(listings)
+
+    def __len__(self) -> int:
+        return len(self._ints["id"])
+
+    def __iter__(self) -> Iterator[Listing]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def __getitem__(self, row: int) -> Listing:
+        return Listing(**self.row_dict(row))
+
+    def extend(self, listings: Iterable[Listing]) -> None:
+        """Append every listing in listings."""
+        for listing in listings:
+            self.append(listing)
+
+    def append(self, listing: Listing) -> None:
+        """Append a single listing."""
+        row = len(self)
+        flat = _flatten(listing.dict(exclude={"photos"}))
+        rate = flat.pop("shipping.us_rate", NO_RATE)
+        if rate is None:
+            flat["shipping.us_rate.amount_cents"] = NO_RATE
+        self._record_prices(row, flat)
+        for field in INT_FIELDS:
+            self._ints[field].append(flat[field])
+        for field in BOOL_FIELDS:
+            self._bools[field].append(flat[field])
+        for field in CODED_FIELDS:
+            value = flat.get(field)
+            if isinstance(value, list):
+                value = tuple(value)
+            self._codes[field].append(self._tables[field].encode(value))
+        for field in TEXT_FIELDS:
+            self._texts[field].append(flat[field])
+        self._photos.append(self._encode_photos(listing.photos))
+
+    def _record_prices(self, row: int, flat: Dict[str, Any]) -> None:
+        """Keep price strings that cannot be derived from their cents."""
+        for prefix in PRICE_FIELDS:
+            cents = flat.get(f"{prefix}.amount_cents", NO_RATE)
+            if cents == NO_RATE:
+                continue
+            symbol = flat[f"{prefix}.symbol"]
+            for name, derive in DERIVED.items():
+                field = f"{prefix}.{name}"
+                value = flat[field]
+                if value != derive(cents, symbol):
+                    self._overrides.setdefault(field, {})[row] = value
+
+    def _restore_prices(self, row: int, flat: Dict[str, Any]) -> None:
+        """Inverse of _record_prices."""
+        for prefix in PRICE_FIELDS:
+            cents = flat[f"{prefix}.amount_cents"]
+            if cents == NO_RATE:
+                continue
+            symbol = flat[f"{prefix}.symbol"]
+            for name, derive in DERIVED.items():
+                field = f"{prefix}.{name}"
+                override = self._overrides.get(field, {}).get(row)
+                flat[field] = (override if override is not None
+                               else derive(cents, symbol))
+
+    def _encode_photos(self,
+                       photos: List[Photo]) -> Tuple[Optional[str], ...]:
+        """Flatten photo links into a tuple of interned hrefs, one
+        None entry per photo without links."""
+        hrefs: List[Optional[str]] = []
+        for photo in photos:
+            if photo.links is None:
+                hrefs.append(None)
+                continue
+            for name in PHOTO_LINKS:
+                code = self._hrefs.encode(getattr(photo.links, name).href)
+                hrefs.append(self._hrefs.decode(code))
+        return tuple(hrefs)
+
+    @staticmethod
+    def _decode_photos(hrefs: Tuple[Optional[str], ...]) -> List[Any]:
+        """Inverse of _encode_photos."""
+        photos: List[Any] = []
+        index = 0
+        while index < len(hrefs):
+            if hrefs[index] is None:
+                photos.append({"_links": None})
+                index += 1
+                continue
+            photos.append({"_links": {
+                name: {"href": hrefs[index + offset]}
+                for offset, name in enumerate(PHOTO_LINKS)}})
+            index += len(PHOTO_LINKS)
+        return photos
+
+    def column(self, field: str) -> List[Any]:
+        """Return the decoded values of a single flattened field, e.g.
+        "make" or "price.amount_cents", without building listings."""
+        if field in self._ints:
+            return list(self._ints[field])
+        if field in self._bools:
+            return [bool(i) for i in self._bools[field]]
+        if field in self._codes:
+            values = self._tables[field].values
+            return [values[i] for i in self._codes[field]]
+        if field in self._texts:
+            return list(self._texts[field])
+        raise KeyError(field)
+
+    def row_dict(self, row: int) -> Dict[str, Any]:
+        """Return the listing at row as a nested dictionary suitable
+        for Listing(**data)."""
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("listing index out of range")
+        flat: Dict[str, Any] = {}
+        for field in INT_FIELDS:
+            flat[field] = self._ints[field][row]
+        for field in BOOL_FIELDS:
+            flat[field] = bool(self._bools[field][row])
+        for field in CODED_FIELDS:
+            value = self._tables[field].decode(self._codes[field][row])
+            flat[field] = list(value) if isinstance(value, tuple) else value
+        for field in TEXT_FIELDS:
+            flat[field] = self._texts[field][row]
+        flat["photos"] = self._decode_photos(self._photos[row])
+        self._restore_prices(row, flat)
+
+        if flat["shipping.us_rate.amount_cents"] == NO_RATE:
+            for key in [i for i in flat if i.startswith("shipping.us_rate.")]:
+                del flat[key]
+            flat["shipping.us_rate"] = None
+        return _nest(flat)
+
+    def to_listings(self) -> List[Listing]:
+        """Return every stored listing as a Listing object."""
+        return list(self)
+
+
+def measure_memory(data: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """
+    Measure memory retained by data parsed from JSON and loaded as
+    List[Listing] and as CompactListings, with tracemalloc.
+
+    Args:
+        data (List[Dict[str, Any]]): Raw listing dictionaries, as in a
+            crawl dump.
+
+    Returns:
+        Tuple[int, int]: Bytes allocated for the list of Listing
+            objects and for the compact store.
+    """
+    text = json.dumps(data)
+    builds: Tuple[Callable[[List[Dict[str, Any]]], object], ...] = (
+        lambda raw: [Listing(**i) for i in raw],
+        lambda raw: CompactListings(Listing(**i) for i in raw),
+    )
+    sizes = []
+    for build in builds:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        store = build(json.loads(text))
+        gc.collect()
+        sizes.append(tracemalloc.get_traced_memory()[0] - before)
+        tracemalloc.stop()
+        del store
+    return sizes[0], sizes[1]
+
+
+def main() -> None:
+    """Report per listing memory use of a crawl dump."""
+    parser = argparse.ArgumentParser(
+        description="Compare List[Listing] and CompactListings memory.")
+    parser.add_argument("dumps", nargs="+", type=Path)
+    args = parser.parse_args()
+    data: List[Dict[str, Any]] = []
+    for path in args.dumps:
+        with open(path, "r", encoding="utf-8") as infile:
+            loaded = json.load(infile)
+        data += loaded["listings"] if isinstance(loaded, dict) else loaded
+    listing_bytes, compact_bytes = measure_memory(data)
+    count = len(data)
+    print(f"listings:        {count}")
+    print(f"List[Listing]:   {listing_bytes / count:,.0f} bytes/listing")
+    print(f"CompactListings: {compact_bytes / count:,.0f} bytes/listing")
+    print(f"reduction:       {1 - compact_bytes / listing_bytes:.1%}")
+
+
+if __name__ == "__main__":
+    main()
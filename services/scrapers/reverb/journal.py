@@ -0,0 +1,120 @@
+"""journal.py"""
+
+import json
+import os
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from .reverb_models import Listing
+
+
+class CrawlJournal:
+    """
+    Append-only checkpoint journal for a single category crawl.
+
+    Each line of the journal is a JSON record. The first record names
+    the crawl and the number of pages it covers, every following record
+    holds one completed page and its listings. Records are flushed and
+    fsynced as they are written, so a crawl that dies part way through
+    can be resumed by opening the journal with the same crawl id.
+
+    Args:
+        path (Path): Journal file location.
+        crawl_id (str): Identifier shared by every run of one crawl.
+        instrument (str): Category being crawled.
+
+    Raises:
+        ValueError: If the journal at path belongs to a different crawl.
+    """
+
+    def __init__(self, path: Path, crawl_id: str, instrument: str) -> None:
+        self.path = path
+        self.crawl_id = crawl_id
+        self.instrument = instrument
+        self.total_pages: Optional[int] = None
+        self.completed_pages: Set[int] = set()
+        if path.exists():
+            self._load()
+
+    @classmethod
+    def for_crawl(cls, directory: Path, crawl_id: str,
+                  instrument: str) -> "CrawlJournal":
+        """Return the journal for crawl_id and instrument in directory."""
+        directory.mkdir(parents=True, exist_ok=True)
+        return cls(directory / f"reverb_{instrument}_{crawl_id}.jsonl",
+                   crawl_id, instrument)
+
+    def _records(self) -> List[Dict[str, Any]]:
+        """Read every intact record, truncating a partially written
+        trailing record left behind by a crash."""
+        records: List[Dict[str, Any]] = []
+        good_offset = 0
+        with open(self.path, "rb") as infile:
+            for line in infile:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Incomplete record")
+                    records.append(json.loads(line))
+                except (JSONDecodeError, ValueError):
+                    break
+                good_offset += len(line)
+        if good_offset != self.path.stat().st_size:
+            with open(self.path, "rb+") as outfile:
+                outfile.truncate(good_offset)
+        return records
+
+    def _load(self) -> None:
+        """Restore crawl progress from an existing journal."""
+        records = self._records()
+        if not records:
+            return
+        header = records[0]
+        if (header.get("crawl_id") != self.crawl_id or
+                header.get("instrument") != self.instrument):
+            raise ValueError(f"{self.path} belongs to crawl "
+                             f"{header.get('crawl_id')} of "
+                             f"{header.get('instrument')}")
+        self.total_pages = header["total_pages"]
+        self.completed_pages = {i["page"] for i in records[1:]}
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        """Durably append a single record to the journal."""
+        line = json.dumps(record, default=lambda x: x.__dict__)
+        with open(self.path, "a", encoding="utf-8") as outfile:
+            outfile.write(line + "\n")
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+    def start(self, total_pages: int) -> None:
+        """Record the start of a crawl. Does nothing if the crawl has
+        already been started."""
+        if self.total_pages is not None:
+            return
+        self._append({"type": "start",
+                      "crawl_id": self.crawl_id,
+                      "instrument": self.instrument,
+                      "total_pages": total_pages})
+        self.total_pages = total_pages
+
+    def record_page(self, page: int, listings: List[Listing]) -> None:
+        """Record a completed page and its listings."""
+        if self.total_pages is None:
+            raise ValueError("Journal has not been started")
+        self._append({"type": "page",
+                      "page": page,
+                      "listings": [i.dict() for i in listings]})
+        self.completed_pages.add(page)
+
+    def remove(self) -> None:
+        """Delete the journal once its crawl has been dumped, so the
+        crawl id cannot resume stale data."""
+        self.path.unlink(missing_ok=True)
+        self.total_pages = None
+        self.completed_pages = set()
+
+    def listings(self) -> List[Listing]:
+        """Return every journaled listing in page order."""
+        pages: Dict[int, List[Dict[str, Any]]] = {}
+        for record in self._records()[1:]:
+            pages[record["page"]] = record["listings"]
+        return [Listing(**i) for page in sorted(pages) for i in pages[page]]
@@ -0,0 +1,109 @@
+"""matching.py"""
+
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.future.engine import Engine
+from sqlalchemy import func
+from sqlmodel import Session, col, select
+from db.models import Instrument, UserInstrumentLink, UserListingMatch
+from .reverb_models import Listing
+
+
+def instrument_type(category: str) -> str:
+    """Map a reverb category name (e.g. electric_guitars) to the
+    Instrument.type it holds (electric_guitar)."""
+    return category[:-1] if category.endswith("s") else category
+
+
+def _batches(listings: Iterable[Listing],
+             size: int) -> Iterable[List[Listing]]:
+    """Yield listings in lists of at most size."""
+    batch: List[Listing] = []
+    for listing in listings:
+        batch.append(listing)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def record_matches(listings: Iterable[Listing],
+                   category: str,
+                   engine: Engine,
+                   crawl_id: Optional[str] = None,
+                   batch_size: int = 500) -> int:
+    """
+    Append newly matched listings to the user_listing_match feed.
+
+    A listing matches a User's Instrument when the Instrument's type is
+    the crawled category, its make equals the listing make and its
+    model is contained in the listing model, all ignoring case.
+    Candidate Instruments are looked up per batch by type and lower(make),
+    which the (type, lower(make)) expression index serves directly.
+    Pairs already in the feed are skipped, so re-running a crawl only
+    adds new matches.
+
+    Args:
+        listings (Iterable[reverb_models.Listing]): Crawled listings.
+        category (str): Category the listings were crawled from.
+        engine (Engine): Application database engine.
+        crawl_id (Optional[str]): Crawl the listings came from.
+        batch_size (int): Listings matched per transaction.
+
+    Returns:
+        int: Number of matches added.
+    """
+    kind = instrument_type(category)
+    added = 0
+    # Oldest first, so feed ids increase with listing recency.
+    ordered = sorted(listings,
+                     key=lambda listing: datetime.strptime(
+                         listing.published_at, "%Y-%m-%dT%H:%M:%S%z"))
+    for batch in _batches(ordered, batch_size):
+        with Session(engine) as session:
+            stmt = (select(UserInstrumentLink.user_id, Instrument)
+                    .join(Instrument)
+                    .where(Instrument.type == kind)
+                    .where(func.lower(Instrument.make)
+                           .in_({i.make.lower() for i in batch})))
+            wanted: Dict[str, List[Tuple[int, Instrument]]] = {}
+            for user_id, instrument in session.exec(stmt):
+                if user_id is not None:
+                    wanted.setdefault(instrument.make.lower(), []).append(
+                        (user_id, instrument))
+            if not wanted:
+                continue
+
+            stmt_seen = (select(UserListingMatch.user_id,
+                                UserListingMatch.listing_id)
+                         .where(col(UserListingMatch.listing_id)
+                                .in_([i.id for i in batch])))
+            seen: Set[Tuple[int, int]] = set(session.exec(stmt_seen))
+            now = datetime.now(timezone.utc)
+
+            for listing in batch:
+                model = listing.model.lower()
+                for user_id, instrument in wanted.get(listing.make.lower(), []):
+                    if (instrument.model.lower() not in model or
+                            (user_id, listing.id) in seen):
+                        continue
+                    seen.add((user_id, listing.id))
+                    session.add(UserListingMatch(
+                        user_id=user_id,
+                        instrument_id=instrument.id,
+                        listing_id=listing.id,
+                        crawl_id=crawl_id,
+                        title=listing.title,
+                        make=listing.make,
+                        model=listing.model,
+                        slug=listing.slug,
+                        price_cents=listing.price.amount_cents,
+                        currency=listing.price.currency,
+                        published_at=datetime.strptime(
+                            listing.published_at, "%Y-%m-%dT%H:%M:%S%z"),
+                        date_created=now))
+                    added += 1
+            session.commit()
+
+    return added
@@ -0,0 +1,115 @@
+"""queue_benchmark.py"""
+
+import argparse
+import tempfile
+from pathlib import Path
+from threading import Thread
+from time import perf_counter, sleep
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy.future.engine import Engine
+from sqlmodel import Session, col, select
+from db.models import CrawlTask
+from .reverb import category_uuids, new_crawl_id
+from .reverb_models import Listing
+from .work_queue import (LEASED, PENDING, Fetcher, enqueue_crawl,
+                         queue_engine, run_worker)
+
+
+def fixed_latency_fetcher(latency: float) -> Fetcher:
+    """Return a fake fetcher that waits latency seconds, standing in for
+    a reverb.com request, and returns no listings."""
+    # pylint: disable=unused-argument
+    def fetch(uuid: str, page: int) -> List[Listing]:
+        sleep(latency)
+        return []
+    return fetch
+
+
+def run_workers(engine: Engine, workers: int, fetch: Fetcher) -> float:
+    """Drain the queue with workers threads, each its own worker with
+    its own connections, returning the elapsed time."""
+    threads = [Thread(target=run_worker, args=(f"bench{i}", engine, fetch))
+               for i in range(workers)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return perf_counter() - start
+
+
+def run_benchmark(database_url: str,
+                  worker_counts: Sequence[int] = (1, 2, 4, 8),
+                  pages: int = 200,
+                  latency: float = 0.05) -> Dict[int, float]:
+    """
+    Measure crawl throughput through the work queue for each number of
+    workers, with a fake fetcher of fixed latency so that the queue
+    overhead, not the reverb API, is what is measured.
+
+    Args:
+        database_url (str): Work queue database url.
+        worker_counts (Sequence[int]): Numbers of workers to run.
+        pages (int): Pages to crawl per run.
+        latency (float): Seconds each fake fetch takes.
+
+    Returns:
+        Dict[int, float]: Pages per second by number of workers.
+
+    Raises:
+        ValueError: If the queue already has pending or leased tasks,
+            which the benchmark workers would take.
+    """
+    engine = queue_engine(database_url)
+    with Session(engine) as session:
+        stmt = (select(CrawlTask.id)
+                .where(col(CrawlTask.status).in_((PENDING, LEASED))))
+        if session.exec(stmt).first() is not None:
+            engine.dispose()
+            raise ValueError("Work queue has unfinished tasks, "
+                             "benchmark against an idle queue")
+
+    instrument = next(iter(category_uuids))
+    fetch = fixed_latency_fetcher(latency)
+    results: Dict[int, float] = {}
+    for workers in worker_counts:
+        enqueue_crawl(f"bench-{new_crawl_id()}", instrument, pages + 1,
+                      engine)
+        results[workers] = pages / run_workers(engine, workers, fetch)
+    engine.dispose()
+    return results
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark work queue throughput by worker count.")
+    parser.add_argument("--database-url",
+                        help="Defaults to a temporary SQLite database.")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Seconds per fake page fetch.")
+    args = parser.parse_args()
+
+    directory: Optional[tempfile.TemporaryDirectory[str]] = None
+    if args.database_url is None:
+        directory = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{Path(directory.name) / 'queue.db'}"
+
+    try:
+        results = run_benchmark(args.database_url, args.workers,
+                                args.pages, args.latency)
+    except ValueError as err:
+        parser.error(str(err))
+    baseline = results[args.workers[0]]
+    for workers, rate in results.items():
+        print(f"{workers} workers: {rate:.1f} pages/s "
+              f"({rate / baseline:.2f}x)")
+    if directory:
+        directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 """reverb.py"""
 
+import argparse
 import json
 from json import JSONDecodeError
-from datetime import datetime
+from datetime import datetime, timezone
+from http import HTTPStatus
 from pathlib import Path
 from sys import exit as sys_exit
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
 import requests
 from requests.exceptions import ConnectTimeout
+from sqlalchemy.future.engine import Engine
+from .journal import CrawlJournal
+from .matching import record_matches
 from .reverb_models import Results, Listing
 
 category_uuids = {
@@ -31,9 +37,132 @@ category_uuids = {
 URL = "https://api.reverb.com/api/"
 
 
+def new_crawl_id() -> str:
+    """Return a unique crawl id, e.g. 20230402T130509-1a2b3c."""
+    return (f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}"
+            f"-{uuid4().hex[:6]}")
+
+
+class ReverbAPIError(Exception):
+    """A non-200 response from the reverb.com API."""
+
+    def __init__(self, status_code: int, errors: Any,
+                 retry_after: Optional[float] = None) -> None:
+        super().__init__(f"{status_code}: {errors}")
+        self.status_code = status_code
+        self.errors = errors
+        self.retry_after = retry_after
+
+    @property
+    def rate_limited(self) -> bool:
+        """Whether the request was rejected by the API rate limit."""
+        return self.status_code == HTTPStatus.TOO_MANY_REQUESTS
+
+    @classmethod
+    def from_response(cls, response: requests.Response) -> "ReverbAPIError":
+        """Build the error from a response, whatever shape its body has.
+        Error bodies normally carry an "errors" object, but rate limit
+        and proxy responses may only have a message, or no JSON at all."""
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        errors = body.get("errors", body) if isinstance(body, dict) else body
+        try:
+            retry_after: Optional[float] = float(
+                response.headers.get("Retry-After", ""))
+        except ValueError:
+            retry_after = None
+        return cls(response.status_code, errors, retry_after)
+
+
+def fetch_total_pages(url: str, uuid: str,
+                      pages: Optional[int] = None) -> int:
+    """
+    Get the exclusive upper bound of listing pages to scrape for a
+    reverb.com category.
+
+    Args:
+        url (str): Url for reverb.com API.
+        uuid (str): Category uuid.
+        pages (Optional[int]): Number of pages of listings to scrape.
+            Defaults to None. If default, will scrape all pages plus
+            one, floor divided by 50.
+
+    Returns:
+        int: One past the last page number to scrape.
+    """
+    try:
+        response = requests.get(f"{url}categories/{uuid}", timeout=60)
+        assert response.status_code == 200
+        total_pages: int = (pages + 1 if pages else
+                            response.json()["total_pages"] // 50)
+
+    # TODO: Log and handle error
+    except AssertionError:
+        sys_exit(ReverbAPIError.from_response(response).errors)
+    except ConnectTimeout:
+        sys_exit("Request has timed out")
+    except JSONDecodeError:
+        sys_exit("Response could not be serialized")
+
+    return total_pages
+
+
+def request_page(uuid: str, page: int) -> List[Listing]:
+    """
+    Get a single page of listings for a reverb.com category, raising
+    on errors rather than exiting.
+
+    Args:
+        uuid (str): Category uuid.
+        page (int): Page number to fetch.
+
+    Returns:
+        List[reverb_models.Listing]: The listings on the page.
+
+    Raises:
+        ReverbAPIError: If the API does not respond with 200.
+        requests.RequestException: If the request fails.
+        ValueError: If the response is not valid listings JSON.
+    """
+    response = requests.get(f"{URL}categories/{uuid}?page={str(page)}",
+                            timeout=60)
+    if response.status_code != 200:
+        raise ReverbAPIError.from_response(response)
+    page_of_listings: List[Listing] = Results(**response.json()).listings
+    return page_of_listings
+
+
+def fetch_page(uuid: str, page: int) -> List[Listing]:
+    """
+    Get a single page of listings for a reverb.com category.
+
+    Args:
+        uuid (str): Category uuid.
+        page (int): Page number to fetch.
+
+    Returns:
+        List[reverb_models.Listing]: The listings on the page.
+    """
+    try:
+        page_of_listings = request_page(uuid, page)
+
+    # TODO: Log and handle error
+    except ReverbAPIError as err:
+        sys_exit(err.errors)
+    except ConnectTimeout:
+        sys_exit("Request has timed out")
+    except JSONDecodeError:
+        sys_exit("Response could not be serialized")
+
+    return page_of_listings
+
+
 def scrape_reverb(url: str,
                   instrument: str,
-                  pages: Optional[int] = None) -> List[Listing]:
+                  pages: Optional[int] = None,
+                  journal: Optional[CrawlJournal] = None) -> List[Listing]:
     """
     Scrape reverb.com for listings of supplied instrument type.
 
@@ -43,6 +172,10 @@ def scrape_reverb(url: str,
         pages (Optional[int]): Number of pages of listings to scrape.
             Defaults to None. If default, will scrape all pages plus
             one, floor divided by 50.
+        journal (Optional[CrawlJournal]): Checkpoint journal to record
+            completed pages in. Defaults to None. If supplied, pages
+            already in the journal are skipped and the returned
+            listings are read back from the journal.
 
     Returns:
         List[reverb_models.Listing]: A list of reverb.com listing dictionaries.
@@ -58,38 +191,26 @@ def scrape_reverb(url: str,
     uuid = category_uuids[instrument]
     data: List[Listing] = []
 
-    try:
-        response = requests.get(f"{url}categories/{uuid}", timeout=60)
-        assert response.status_code == 200
-        total_pages = (pages + 1 if pages else
-                       response.json()["total_pages"] // 50)
-
-    # TODO: Log and handle error
-    except AssertionError:
-        sys_exit(response.json()["errors"])
-    except ConnectTimeout:
-        sys_exit("Request has timed out")
-    except JSONDecodeError:
-        sys_exit("Response could not be serialized")
+    if journal and journal.total_pages is not None:
+        total_pages = journal.total_pages
+    else:
+        total_pages = fetch_total_pages(url, uuid, pages)
+        if journal:
+            journal.start(total_pages)
 
     for page in range(1, total_pages):
 
-        try:
-            response = requests.get(f"{URL}categories/{uuid}?page={str(page)}",
-                                    timeout=60)
-            assert response.status_code == 200
-            results = Results(**response.json())
-
-        # TODO: Log and handle error
-        except AssertionError:
-            sys_exit(response.json()["errors"])
-        except ConnectTimeout:
-            sys_exit("Request has timed out")
-        except JSONDecodeError:
-            sys_exit("Response could not be serialized")
-
-        page_of_listings: List[Listing] = results.listings
-        data += page_of_listings
+        if journal and page in journal.completed_pages:
+            continue
+
+        page_of_listings = fetch_page(uuid, page)
+        if journal:
+            journal.record_page(page, page_of_listings)
+        else:
+            data += page_of_listings
+
+    if journal:
+        data = journal.listings()
 
     data.sort(key=lambda listing: datetime.strptime(listing.published_at,
                                                     "%Y-%m-%dT%H:%M:%S%z"),
@@ -118,8 +239,57 @@ def dump_scrape(data: List[Listing], file_path: Path) -> None:
     #  TODO: Save JSON file to blog storage (S3)
 
 
+def run_crawl(crawl_id: str,
+              dump_dir: Path,
+              engine: Optional[Engine] = None) -> Dict[str, List[Listing]]:
+    """
+    Scrape and dump every category, checkpointing each in a journal
+    under dump_dir / "journal". The journals are only removed once
+    every category has been dumped, so rerunning an interrupted crawl
+    id resumes it wherever it stopped, re-dumping earlier categories
+    from their journals without fetching them again.
+
+    Args:
+        crawl_id (str): Id of the crawl, or of an interrupted crawl to
+            resume.
+        dump_dir (Path): Directory to write reverb_<category>.json
+            dumps to.
+        engine (Optional[Engine]): Application database engine to
+            record user listing matches in. Defaults to None, in which
+            case no matches are recorded.
+
+    Returns:
+        Dict[str, List[reverb_models.Listing]]: Dumped listings by
+            category.
+    """
+    journals = [CrawlJournal.for_crawl(dump_dir / "journal", crawl_id, i)
+                for i in category_uuids]
+    scrapes: Dict[str, List[Listing]] = {}
+    for journal in journals:
+        catagory = journal.instrument
+        scrapes[catagory] = scrape_reverb(URL, catagory, journal=journal)
+        dump_scrape(scrapes[catagory], dump_dir / f"reverb_{catagory}.json")
+        if engine:
+            record_matches(scrapes[catagory], catagory, engine, crawl_id)
+    for journal in journals:
+        journal.remove()
+    return scrapes
+
+
 if __name__ == "__main__":
-    path = Path(__file__).parent
-    for catagory in category_uuids:
-        dump_scrape(scrape_reverb(URL, catagory),
-                    path / "dumps" / f"reverb_{catagory}.json")
+    parser = argparse.ArgumentParser(description="Scrape reverb.com.")
+    parser.add_argument("--crawl-id",
+                        help="Id of an interrupted crawl to resume. "
+                             "Defaults to a new crawl.")
+    parser.add_argument("--no-match", action="store_true",
+                        help="Do not record user listing matches.")
+    args = parser.parse_args()
+    crawl_id = args.crawl_id or new_crawl_id()
+    print(f"Crawl id: {crawl_id}")
+    match_engine: Optional[Engine] = None
+    if not args.no_match:
+        # pylint: disable=import-outside-toplevel
+        from db.database import create_db_and_tables, engine
+        create_db_and_tables()
+        match_engine = engine
+    run_crawl(crawl_id, Path(__file__).parent / "dumps", match_engine)
@@ -0,0 +1,497 @@
+"""work_queue.py"""
+
+import argparse
+import json
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from pathlib import Path
+from sys import exit as sys_exit
+from time import sleep
+from typing import Callable, Dict, List, Optional, TypeVar, cast
+from requests import RequestException
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.engine import CursorResult, make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.future.engine import Engine
+from sqlmodel import Session, SQLModel, col, create_engine, select
+from db.models import CrawlTask
+from .matching import record_matches
+from .reverb import (URL, ReverbAPIError, category_uuids, dump_scrape,
+                     fetch_total_pages, new_crawl_id, request_page)
+from .reverb_models import Listing
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+STATUSES = (PENDING, LEASED, DONE, FAILED)
+
+Fetcher = Callable[[str, int], List[Listing]]
+T = TypeVar("T")
+
+MAX_BACKOFF = 300
+SQLITE_BUSY_TIMEOUT = 30
+
+
+def _utcnow() -> datetime:
+    """Naive UTC now, so lease times compare the same way on every
+    database backend."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _retry_locked(call: Callable[[], T],
+                  retries: int = 5,
+                  delay: float = 1) -> T:
+    """Call call, retrying with a growing delay while the database
+    raises OperationalError, e.g. SQLite's "database is locked" when
+    many workers write at once."""
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except OperationalError:
+            attempt += 1
+            if attempt >= retries:
+                raise
+            sleep(delay * attempt)
+
+
+def enqueue_crawl(crawl_id: str,
+                  instrument: str,
+                  total_pages: int,
+                  engine: Engine) -> int:
+    """
+    Enqueue a task for every page of a category crawl. Pages already
+    queued for the crawl are left alone, so enqueueing is idempotent.
+
+    Args:
+        crawl_id (str): Identifier shared by every task of one crawl.
+        instrument (str): Category to crawl.
+        total_pages (int): One past the last page number to crawl.
+        engine (Engine): Work queue database engine.
+
+    Returns:
+        int: Number of tasks added.
+    """
+    with Session(engine) as session:
+        stmt = (select(CrawlTask.page)
+                .where(CrawlTask.crawl_id == crawl_id)
+                .where(CrawlTask.instrument == instrument))
+        queued = set(session.exec(stmt))
+        now = _utcnow()
+        added = 0
+        for page in range(1, total_pages):
+            if page not in queued:
+                session.add(CrawlTask(crawl_id=crawl_id,
+                                      instrument=instrument,
+                                      page=page,
+                                      date_created=now))
+                added += 1
+        session.commit()
+
+    return added
+
+
+def lease_task(worker_id: str,
+               engine: Engine,
+               lease_seconds: float = 300,
+               max_attempts: int = 3) -> Optional[CrawlTask]:
+    """
+    Lease the next pending task, or a leased task whose lease has
+    expired because its worker died. An expired task that has already
+    been attempted max_attempts times is marked failed instead, so a
+    page that kills its worker is not handed out forever.
+
+    On Postgres the candidate row is selected FOR UPDATE SKIP LOCKED so
+    concurrent workers never contend for it. Backends without row locks
+    (SQLite) fall back to the conditional update below, which only
+    succeeds for the worker that still sees the row unchanged.
+
+    Args:
+        worker_id (str): Identifier of the leasing worker.
+        engine (Engine): Work queue database engine.
+        lease_seconds (float): How long the worker has to complete the
+            task before another worker may take it over.
+        max_attempts (int): Attempts before an expired task is marked
+            failed.
+
+    Returns:
+        Optional[CrawlTask]: The leased task, or None if there is no
+            work available.
+    """
+    while True:
+        with Session(engine) as session:
+            now = _utcnow()
+            stmt = (select(CrawlTask)
+                    .where(or_(col(CrawlTask.status) == PENDING,
+                               and_(col(CrawlTask.status) == LEASED,
+                                    col(CrawlTask.lease_expires) < now)))
+                    .order_by(col(CrawlTask.id))
+                    .limit(1)
+                    .with_for_update(skip_locked=True))
+            task = session.exec(stmt).first()
+            if task is None:
+                return None
+
+            if task.status == LEASED and task.attempts >= max_attempts:
+                values: Dict[str, object] = {
+                    "status": FAILED,
+                    "lease_expires": None,
+                    "error": f"Lease expired after {task.attempts} "
+                             f"attempts, last held by {task.worker_id}"}
+            else:
+                values = {
+                    "status": LEASED,
+                    "worker_id": worker_id,
+                    "lease_expires": now + timedelta(seconds=lease_seconds),
+                    "attempts": task.attempts + 1}
+            claimed = cast(CursorResult, session.execute(
+                update(CrawlTask)
+                .where(col(CrawlTask.id) == task.id)
+                .where(col(CrawlTask.status) == task.status)
+                .where(col(CrawlTask.attempts) == task.attempts)
+                .values(**values)
+                .execution_options(synchronize_session=False)))
+            session.commit()
+            if claimed.rowcount == 1 and values["status"] == LEASED:
+                session.refresh(task)
+                return task
+
+
+def _finish_task(task: CrawlTask,
+                 worker_id: str,
+                 engine: Engine,
+                 **values: object) -> bool:
+    """Update a task still leased to worker_id, returning False if the
+    lease was lost."""
+    with Session(engine) as session:
+        finished = cast(CursorResult, session.execute(
+            update(CrawlTask)
+            .where(col(CrawlTask.id) == task.id)
+            .where(col(CrawlTask.status) == LEASED)
+            .where(col(CrawlTask.worker_id) == worker_id)
+            .where(col(CrawlTask.attempts) == task.attempts)
+            .values(**values)
+            .execution_options(synchronize_session=False)))
+        session.commit()
+
+    return finished.rowcount == 1
+
+
+def complete_task(task: CrawlTask,
+                  worker_id: str,
+                  listings: List[Listing],
+                  engine: Engine) -> bool:
+    """
+    Store a leased task's listings and mark it done.
+
+    Returns:
+        bool: False if the lease expired and the task was taken over
+            by another worker, in which case the listings are dropped.
+    """
+    result = json.dumps([i.dict() for i in listings],
+                        default=lambda x: x.__dict__)
+    return _finish_task(task, worker_id, engine,
+                        status=DONE,
+                        result=result,
+                        lease_expires=None,
+                        date_completed=_utcnow())
+
+
+def fail_task(task: CrawlTask,
+              worker_id: str,
+              error: str,
+              engine: Engine,
+              max_attempts: int = 3) -> bool:
+    """
+    Release a leased task after an error. The task is requeued until
+    it has been attempted max_attempts times, then marked failed.
+
+    Returns:
+        bool: False if the lease had already been lost.
+    """
+    status = FAILED if task.attempts >= max_attempts else PENDING
+    return _finish_task(task, worker_id, engine,
+                        status=status,
+                        error=error,
+                        lease_expires=None)
+
+
+def release_task(task: CrawlTask,
+                 worker_id: str,
+                 error: str,
+                 engine: Engine,
+                 delay: float) -> bool:
+    """
+    Hand a leased task back without counting the attempt, e.g. after
+    the API rate limited the request. The lease is cut short to expire
+    in delay seconds, after which any worker may take the task, so it
+    is not retried before the backoff has passed.
+
+    Returns:
+        bool: False if the lease had already been lost.
+    """
+    return _finish_task(task, worker_id, engine,
+                        attempts=task.attempts - 1,
+                        error=error,
+                        lease_expires=_utcnow() + timedelta(seconds=delay))
+
+
+def crawl_progress(crawl_id: str, engine: Engine) -> Dict[str, int]:
+    """Count a crawl's tasks by status, plus a total."""
+    with Session(engine) as session:
+        counts = (session.query(CrawlTask.status, func.count(CrawlTask.id))
+                  .filter(CrawlTask.crawl_id == crawl_id)
+                  .group_by(CrawlTask.status)
+                  .all())
+        progress = {i: 0 for i in STATUSES}
+        for status, count in counts:
+            progress[status] = count
+
+    progress["total"] = sum(progress[i] for i in STATUSES)
+    return progress
+
+
+def _record_fetch_error(task: CrawlTask,
+                        worker_id: str,
+                        engine: Engine,
+                        err: BaseException,
+                        max_attempts: int,
+                        backoff: float) -> Optional[float]:
+    """
+    Record a fetch error against a leased task. A rate limited task is
+    released until the Retry-After the API gave, or else for backoff
+    seconds.
+
+    Returns:
+        Optional[float]: Seconds to wait before fetching again if the
+            fetch was rate limited, otherwise None.
+    """
+    if isinstance(err, ReverbAPIError) and err.rate_limited:
+        delay = err.retry_after or backoff
+        release_task(task, worker_id, f"Rate limited: {err.errors}",
+                     engine, delay)
+        return delay
+    if isinstance(err, SystemExit):
+        error = str(err.code)
+    else:
+        error = f"{type(err).__name__}: {err}"
+    fail_task(task, worker_id, error, engine, max_attempts)
+    return None
+
+
+def run_worker(worker_id: str,
+               engine: Engine,
+               fetch: Fetcher = request_page,
+               lease_seconds: float = 300,
+               max_attempts: int = 3,
+               poll_interval: Optional[float] = None,
+               backoff: float = 1) -> int:
+    """
+    Lease, fetch and complete tasks until the queue is drained.
+
+    Rate limited fetches are not counted as attempts. The task is
+    handed back and the worker waits for the Retry-After the API gave,
+    or otherwise for backoff seconds, doubling on every consecutive rate
+    limit up to MAX_BACKOFF. Queue updates that fail with a database
+    OperationalError, such as a locked SQLite file, are retried a few
+    times before the worker gives up.
+
+    Args:
+        worker_id (str): Unique identifier of this worker.
+        engine (Engine): Work queue database engine.
+        fetch (Fetcher): Fetches a page of listings given a category
+            uuid and page number. Defaults to reverb.request_page.
+        lease_seconds (float): Lease duration per task.
+        max_attempts (int): Attempts before a task is marked failed.
+        poll_interval (Optional[float]): If set, keep polling at this
+            interval while other workers still hold leases, so tasks
+            from dead workers are picked up once their leases expire.
+        backoff (float): Initial wait after a rate limited fetch.
+
+    Returns:
+        int: Number of tasks this worker completed.
+    """
+    completed = 0
+    throttled = 0
+    while True:
+        task = _retry_locked(partial(lease_task, worker_id, engine,
+                                     lease_seconds, max_attempts))
+        if task is None:
+            if poll_interval is None:
+                return completed
+            with Session(engine) as session:
+                stmt = select(CrawlTask.id).where(CrawlTask.status == LEASED)
+                if session.exec(stmt).first() is None:
+                    return completed
+            sleep(poll_interval)
+            continue
+
+        try:
+            listings = fetch(category_uuids[task.instrument], task.page)
+        # fetch_page reports API errors through sys.exit, while
+        # request_page raises them, and connection errors, bad JSON and
+        # invalid listings escape as exceptions. None of them should
+        # take the worker down.
+        except (ReverbAPIError, SystemExit, LookupError, RequestException,
+                TypeError, ValueError) as err:
+            delay = _retry_locked(partial(
+                _record_fetch_error, task, worker_id, engine, err,
+                max_attempts, min(backoff * 2 ** throttled, MAX_BACKOFF)))
+            if delay is not None:
+                sleep(delay)
+                throttled += 1
+            continue
+        throttled = 0
+        if _retry_locked(partial(complete_task, task, worker_id, listings,
+                                 engine)):
+            completed += 1
+
+
+def collect_results(crawl_id: str,
+                    instrument: str,
+                    engine: Engine) -> List[Listing]:
+    """
+    Assemble the listings of a category crawl from its completed tasks.
+
+    Returns:
+        List[reverb_models.Listing]: Listings sorted newest first, as
+            returned by reverb.scrape_reverb.
+    """
+    data: List[Listing] = []
+    with Session(engine) as session:
+        stmt = (select(CrawlTask.result)
+                .where(CrawlTask.crawl_id == crawl_id)
+                .where(CrawlTask.instrument == instrument)
+                .where(CrawlTask.status == DONE)
+                .order_by(CrawlTask.page))
+        for result in session.exec(stmt):
+            data += [Listing(**i) for i in json.loads(result or "[]")]
+
+    data.sort(key=lambda listing: datetime.strptime(listing.published_at,
+                                                    "%Y-%m-%dT%H:%M:%S%z"),
+              reverse=True)
+    return data
+
+
+def dump_crawl(crawl_id: str,
+               engine: Engine,
+               dump_dir: Path,
+               force: bool = False) -> Dict[str, List[Listing]]:
+    """
+    Write a finished crawl's listings to reverb_<category>.json dumps.
+
+    Args:
+        crawl_id (str): Crawl to dump.
+        engine (Engine): Work queue database engine.
+        dump_dir (Path): Directory to write the dumps to.
+        force (bool): Dump even if some tasks are not done. Defaults
+            to False.
+
+    Returns:
+        Dict[str, List[reverb_models.Listing]]: Dumped listings by
+            category.
+
+    Raises:
+        ValueError: If the crawl has no tasks, or unless force is set,
+            if any task is pending, leased or failed, since a partial
+            dump would replace the last complete one.
+    """
+    progress = crawl_progress(crawl_id, engine)
+    unfinished = progress["total"] - progress[DONE]
+    if not progress["total"] or (unfinished and not force):
+        raise ValueError(f"Crawl {crawl_id} is not complete: {progress}")
+
+    scrapes: Dict[str, List[Listing]] = {}
+    for catagory in category_uuids:
+        scrapes[catagory] = collect_results(crawl_id, catagory, engine)
+        dump_scrape(scrapes[catagory],
+                    dump_dir / f"reverb_{catagory}.json")
+    return scrapes
+
+
+def queue_engine(database_url: Optional[str]) -> Engine:
+    """Return an engine for database_url, or the application database,
+    with the work queue tables created. SQLite connections wait up to
+    SQLITE_BUSY_TIMEOUT seconds for a lock rather than the default 5,
+    since every worker process writes to the same file."""
+    if database_url:
+        connect_args = ({"timeout": SQLITE_BUSY_TIMEOUT}
+                        if make_url(database_url).get_backend_name()
+                        == "sqlite" else {})
+        engine = create_engine(database_url, connect_args=connect_args)
+    else:
+        # pylint: disable=import-outside-toplevel
+        from db import database
+        engine = database.engine
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def _parse_args() -> argparse.Namespace:
+    """Parse command line arguments, resolving the crawl id."""
+    parser = argparse.ArgumentParser(
+        description="Distributed reverb.com crawl work queue.")
+    parser.add_argument("command",
+                        choices=("enqueue", "work", "progress", "collect"))
+    parser.add_argument("--crawl-id",
+                        help="Required for progress and collect. "
+                             "enqueue defaults to a new crawl.")
+    parser.add_argument("--database-url",
+                        help="Defaults to the application database.")
+    parser.add_argument("--worker-id",
+                        default=f"{socket.gethostname()}:{os.getpid()}")
+    parser.add_argument("--lease-seconds", type=float, default=300)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--pages", type=int)
+    parser.add_argument("--force", action="store_true",
+                        help="Collect a crawl with unfinished tasks.")
+    parser.add_argument("--no-match", action="store_true",
+                        help="Do not record user listing matches on "
+                             "collect.")
+    args = parser.parse_args()
+    if args.command == "enqueue" and not args.crawl_id:
+        args.crawl_id = new_crawl_id()
+    if args.command in ("progress", "collect") and not args.crawl_id:
+        parser.error(f"--crawl-id is required for {args.command}")
+    return args
+
+
+def main() -> None:
+    """Run the work queue coordinator or a worker from the command
+    line."""
+    args = _parse_args()
+    crawl_id = args.crawl_id
+    engine = queue_engine(args.database_url)
+
+    path = Path(__file__).parent
+    if args.command == "enqueue":
+        for catagory, uuid in category_uuids.items():
+            total_pages = fetch_total_pages(URL, uuid, args.pages)
+            enqueue_crawl(crawl_id, catagory, total_pages, engine)
+    elif args.command == "work":
+        run_worker(args.worker_id, engine,
+                   lease_seconds=args.lease_seconds,
+                   max_attempts=args.max_attempts,
+                   poll_interval=args.lease_seconds / 10)
+    elif args.command == "collect":
+        try:
+            scrapes = dump_crawl(crawl_id, engine, path / "dumps",
+                                 args.force)
+        except ValueError as err:
+            sys_exit(str(err))
+        if not args.no_match:
+            # pylint: disable=import-outside-toplevel
+            from db import database
+            database.create_db_and_tables()
+            for catagory, scrape in scrapes.items():
+                record_matches(scrape, catagory, database.engine, crawl_id)
+    if crawl_id:
+        print(f"Crawl id: {crawl_id}")
+        print(crawl_progress(crawl_id, engine))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""test_async_crud.py"""
+
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db.async_crud import (get_user_by_email, get_instrument_by_id,
+                           update_user_instruments, add_user_instruments,
+                           get_user_instruments, get_user_feed,
+                           delete_user_by_email)
+from db.benchmark import async_url, run_benchmark
+from db.models import User, Instrument
+
+
+def _instrument(make: str, model: str) -> Instrument:
+    """Helper function to build an Instrument."""
+    return Instrument(type="electric_guitar",
+                      make=make,
+                      model=model,
+                      date_created=datetime.now(timezone.utc))
+
+
+class AsyncCrudTests(unittest.IsolatedAsyncioTestCase):
+    """Test async database access."""
+
+    async def asyncSetUp(self) -> None:
+        """Set up an in memory aiosqlite database for testing."""
+        self.engine = create_async_engine(
+            "sqlite+aiosqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+        async with AsyncSession(self.engine) as session:
+            session.add(User(email="david@test.com",
+                             active=True,
+                             date_created=datetime.now(timezone.utc),
+                             instruments=[_instrument("Ibanez", "RG470")]))
+            await session.commit()
+
+    async def asyncTearDown(self) -> None:
+        """Dispose of the test database."""
+        await self.engine.dispose()
+
+    async def test_read_database(self) -> None:
+        """Test reading data from the database."""
+        self.assertIsNone(await get_user_by_email("no@test.com",
+                                                  self.engine))
+        self.assertIsNone(await get_instrument_by_id(99, self.engine))
+
+        instrument = await get_instrument_by_id(1, self.engine)
+        assert instrument is not None
+        self.assertEqual(instrument.make, "Ibanez")
+
+        david = await get_user_by_email("david@test.com", self.engine)
+        assert david is not None
+        instruments = await get_user_instruments(david, self.engine)
+        self.assertEqual([i.model for i in instruments], ["RG470"])
+        self.assertEqual(await get_user_feed(david, self.engine), [])
+
+    async def test_update_database(self) -> None:
+        """Test single and bulk instrument updates."""
+        david = await get_user_by_email("david@test.com", self.engine)
+        assert david is not None
+
+        ceo_10 = _instrument("Martin", "CEO-10")
+        await update_user_instruments(david, ceo_10, self.engine)
+        self.assertIsNotNone(ceo_10.id)
+
+        await add_user_instruments(david,
+                                   [_instrument("Gibson", "Les Paul"),
+                                    _instrument("Fender", "Jaguar")],
+                                   self.engine)
+        instruments = await get_user_instruments(david, self.engine)
+        self.assertEqual(sorted(i.make for i in instruments),
+                         ["Fender", "Gibson", "Ibanez", "Martin"])
+
+        await delete_user_by_email("david@test.com", self.engine)
+        await delete_user_by_email("david@test.com", self.engine)
+        self.assertIsNone(await get_user_by_email("david@test.com",
+                                                  self.engine))
+
+
+class BenchmarkTests(unittest.TestCase):
+    """Test the sync/async benchmark."""
+
+    def test_async_url(self) -> None:
+        """Test deriving async driver urls from sync ones."""
+        self.assertEqual(async_url("sqlite:///bench.db"),
+                         "sqlite+aiosqlite:///bench.db")
+        self.assertEqual(
+            async_url("postgresql://me:pw@host/db?sslmode=require"),
+            "postgresql+asyncpg://me:pw@host/db?ssl=require")
+        with self.assertRaises(ValueError):
+            async_url("mysql://host/db")
+
+    def test_run_benchmark(self) -> None:
+        """Test that the benchmark reports both paths."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "bench.db"
+            results = run_benchmark(f"sqlite:///{path}",
+                                    f"sqlite+aiosqlite:///{path}",
+                                    users=5, instruments=2, concurrency=2)
+        self.assertEqual(set(results), {"sync_seconds",
+                                        "sync_lookups_per_second",
+                                        "async_seconds",
+                                        "async_lookups_per_second"})
+        self.assertTrue(all(i > 0 for i in results.values()))
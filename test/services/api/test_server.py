@@ -0,0 +1,250 @@
+"""test_server.py"""
+
+import json
+import os
+import shutil
+import unittest
+from datetime import datetime, timezone
+from threading import Thread
+from typing import Dict, List, Optional, Tuple
+import requests
+from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy.pool import StaticPool
+from db.models import Instrument, User
+from services.api.cache import ResultCache
+from services.api.load_test import percentile, run_load_test
+from services.api.search import ListingQuery, ListingStore
+from services.api.server import CachedResponse, SearchServer
+from test.services.scrapers.reverb.helpers import (TEST_LISTINGS,
+                                                   TempDirTestCase)
+
+
+class FakeClock:
+    """Manually advanced clock for cache expiry tests."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ResultCacheTests(unittest.TestCase):
+    """Test the LRU/TTL result cache."""
+
+    def test_lru_eviction(self) -> None:
+        """Test the least recently used entry is evicted first."""
+        cache: ResultCache[int] = ResultCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self) -> None:
+        """Test entries expire after their time to live."""
+        clock = FakeClock()
+        cache: ResultCache[int] = ResultCache(ttl=10, clock=clock)
+        cache.put("a", 1)
+        clock.now = 9.9
+        self.assertEqual(cache.get("a"), 1)
+        clock.now = 10.0
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+        with self.assertRaises(ValueError):
+            ResultCache(maxsize=0)
+
+
+class ListingSearchTests(TempDirTestCase):
+    """Test listing queries against a dump directory."""
+
+    def setUp(self) -> None:
+        """Copy the test listings into a temporary dump directory."""
+        super().setUp()
+        shutil.copy(TEST_LISTINGS,
+                    self.directory / "reverb_electric_guitars.json")
+        self.store = ListingStore(self.directory)
+        self.assertTrue(self.store.refresh())
+
+    def test_query_params(self) -> None:
+        """Test query parameter parsing and validation."""
+        query = ListingQuery.from_params({"make": ["Gibson"],
+                                          "page": ["2"],
+                                          "per_page": ["1000"]})
+        self.assertEqual(query.make, "Gibson")
+        self.assertEqual(query.page, 2)
+        self.assertEqual(query.per_page, 100)
+        for params in ({"page": ["0"]}, {"min_price": ["cheap"]},
+                       {"category": ["kazoos"]}):
+            with self.assertRaises(ValueError):
+                ListingQuery.from_params(params)
+
+    def test_search(self) -> None:
+        """Test filtering, ordering and pagination."""
+        page = self.store.search(ListingQuery(make="gibson"))
+        self.assertEqual(page.total, 5)
+        self.assertTrue(all(i.make == "Gibson" for i in page.listings))
+
+        page = self.store.search(ListingQuery(category="electric_guitars",
+                                              per_page=2, page=2))
+        self.assertEqual(page.total, 3)
+        self.assertEqual(page.total_pages, 2)
+        self.assertEqual(len(page.listings), 1)
+
+        page = self.store.search(ListingQuery(max_price=30000))
+        self.assertEqual(page.total, 2)
+
+        everything = self.store.search(ListingQuery(per_page=100)).listings
+        published = [datetime.strptime(i.published_at, "%Y-%m-%dT%H:%M:%S%z")
+                     for i in everything]
+        self.assertEqual(published, sorted(published, reverse=True))
+        self.assertFalse(self.store.refresh())
+
+
+class SearchServerTests(TempDirTestCase):
+    """Test the HTTP search service."""
+
+    def setUp(self) -> None:
+        """Start a search server on a free port."""
+        super().setUp()
+        self.dump = self.directory / "reverb_electric_guitars.json"
+        shutil.copy(TEST_LISTINGS, self.dump)
+        engine = create_engine("sqlite://",
+                               connect_args={"check_same_thread": False},
+                               poolclass=StaticPool)
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(User(email="david@test.com",
+                             active=True,
+                             date_created=datetime.now(timezone.utc),
+                             instruments=[Instrument(
+                                 type="electric_guitar",
+                                 make="Ibanez",
+                                 model="RG470",
+                                 date_created=datetime.now(timezone.utc))]))
+            session.commit()
+        self.server = SearchServer(("127.0.0.1", 0),
+                                   ListingStore(self.directory),
+                                   engine)
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self) -> None:
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _get(self, path: str,
+             etag: Optional[str] = None) -> Tuple[int, Dict[str, str], bytes]:
+        headers = {"If-None-Match": etag} if etag else {}
+        response = requests.get(self.url + path, headers=headers, timeout=10)
+        return response.status_code, dict(response.headers), response.content
+
+    def test_listings(self) -> None:
+        """Test paginated listing search and ETag revalidation."""
+        status, headers, body = self._get("/listings?make=Fender&per_page=2")
+        self.assertEqual(status, 200)
+        data = json.loads(body)
+        self.assertEqual(data["total"], 5)
+        self.assertEqual(data["total_pages"], 3)
+        self.assertEqual(len(data["results"]), 2)
+        self.assertEqual(len(self.server.cache), 1)
+
+        status, _, body = self._get("/listings?make=Fender&per_page=2",
+                                    headers["ETag"])
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b"")
+
+        status, _, body = self._get("/listings?page=zero")
+        self.assertEqual(status, 400)
+        self.assertIn("page", json.loads(body)["error"])
+        self.assertEqual(self._get("/nothing")[0], 404)
+
+    def test_snapshot_invalidates_cache(self) -> None:
+        """Test a new crawl dump clears cached results."""
+        _, headers, _ = self._get("/listings")
+        with open(TEST_LISTINGS, "r", encoding="utf-8") as infile:
+            data: List[Dict[str, object]] = json.load(infile)
+        with open(self.dump, "w", encoding="utf-8") as outfile:
+            json.dump(data[:3], outfile)
+        stat = self.dump.stat()
+        os.utime(self.dump, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        status, new_headers, body = self._get("/listings", headers["ETag"])
+        self.assertEqual(status, 200)
+        self.assertNotEqual(new_headers["ETag"], headers["ETag"])
+        self.assertEqual(json.loads(body)["total"], 3)
+        self.assertEqual(len(self.server.cache), 1)
+
+    def test_truncated_dump(self) -> None:
+        """Test a half written dump keeps the previous snapshot served."""
+        _, headers, _ = self._get("/listings")
+        truncated = self.directory / "reverb_acoustic_guitars.json"
+        with open(TEST_LISTINGS, "r", encoding="utf-8") as infile:
+            text = infile.read()
+        with open(truncated, "w", encoding="utf-8") as outfile:
+            outfile.write(text[:len(text) // 2])
+
+        for _ in range(2):
+            status, new_headers, body = self._get("/listings")
+            self.assertEqual(status, 200)
+            self.assertEqual(new_headers["ETag"], headers["ETag"])
+            self.assertEqual(json.loads(body)["total"], 24)
+
+        with open(truncated, "w", encoding="utf-8") as outfile:
+            json.dump(json.loads(text)[:1] + [{"id": "bad"}], outfile)
+        self.assertEqual(self._get("/listings")[1]["ETag"], headers["ETag"])
+
+        with open(truncated, "w", encoding="utf-8") as outfile:
+            outfile.write(text)
+        stat = truncated.stat()
+        os.utime(truncated, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        status, _, body = self._get("/listings")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["total"], 24)
+        self.assertEqual(len(self.server.store.snapshot or ()), 2)
+
+    def test_user_instruments(self) -> None:
+        """Test the user instruments endpoint."""
+        status, _, body = self._get("/users/david%40test.com/instruments")
+        self.assertEqual(status, 200)
+        results = json.loads(body)["results"]
+        self.assertEqual(results[0]["model"], "RG470")
+        self.assertEqual(self._get("/users/nobody/instruments")[0], 404)
+        self.server.engine = create_engine("sqlite://")
+        status, _, body = self._get("/users/david%40test.com/instruments")
+        self.assertEqual(status, 503)
+        self.assertEqual(json.loads(body)["error"], "Database is unavailable")
+        self.server.engine = None
+        self.assertEqual(self._get("/users/david/instruments")[0], 503)
+
+    def test_load_test(self) -> None:
+        """Test the load test runner against the server."""
+        report = run_load_test([f"{self.url}/listings",
+                                f"{self.url}/missing"], 10, 2)
+        self.assertEqual(report.requests, 10)
+        self.assertEqual(report.errors, 5)
+        self.assertGreater(report.requests_per_second, 0)
+        self.assertIn("p99", str(report))
+
+
+class HelperTests(unittest.TestCase):
+    """Test helper functions."""
+
+    def test_percentile(self) -> None:
+        """Test percentile interpolation."""
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([3.0, 1.0, 2.0], 50), 2.0)
+        self.assertEqual(percentile([1.0, 2.0], 90), 1.9)
+        self.assertEqual(percentile([1.0, 2.0], 100), 2.0)
+
+    def test_cached_response(self) -> None:
+        """Test entity tags follow the response body."""
+        first = CachedResponse.from_data({"a": 1})
+        self.assertEqual(first, CachedResponse.from_data({"a": 1}))
+        self.assertNotEqual(first.etag, CachedResponse.from_data({"a": 2}).etag)
@@ -0,0 +1,32 @@
+"""helpers.py"""
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+from services.scrapers.reverb.reverb_models import Listing
+
+TEST_LISTINGS = Path("./test/services/scrapers/reverb/dumps/test_listings.json")
+
+
+def load_listing_dicts() -> List[Dict[str, Any]]:
+    """Load the raw test listing dictionaries."""
+    with open(TEST_LISTINGS, "r", encoding="utf-8") as infile:
+        data: List[Dict[str, Any]] = json.load(infile)
+    return data
+
+
+def load_listings() -> List[Listing]:
+    """Load the test listings as Listing objects."""
+    return [Listing(**i) for i in load_listing_dicts()]
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Test case with a temporary directory, removed after each test."""
+
+    def setUp(self) -> None:
+        """Create a temporary directory."""
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
@@ -0,0 +1,60 @@
+"""test_compact.py"""
+
+import json
+import unittest
+from typing import Any, Dict, List
+from services.scrapers.reverb.compact import (CompactListings, InternTable,
+                                              measure_memory)
+from services.scrapers.reverb.reverb_models import Listing
+from .helpers import load_listing_dicts
+
+
+class CompactListingsTests(unittest.TestCase):
+    """Test the compact listing store."""
+
+    data: List[Dict[str, Any]] = load_listing_dicts()
+    listings: List[Listing] = [Listing(**i) for i in data]
+
+    def test_round_trip(self) -> None:
+        """Test that listings convert to and from the store losslessly."""
+        store = CompactListings(self.listings)
+        self.assertEqual(len(store), len(self.listings))
+        self.assertEqual(store.to_listings(), self.listings)
+        self.assertEqual(store[-1], self.listings[-1])
+        with self.assertRaises(IndexError):
+            _ = store[len(self.listings)]
+
+    def test_edge_cases(self) -> None:
+        """Test missing shipping rates, photo links and odd prices."""
+        raw = json.loads(json.dumps(self.data[0]))
+        raw["shipping"]["us_rate"] = None
+        raw["photos"].append({})
+        raw["price"]["display"] = "FREE"
+        raw["sku"] = None
+        listing = Listing(**raw)
+        store = CompactListings([listing, self.listings[1]])
+        self.assertEqual(store[0], listing)
+        self.assertEqual(store[1], self.listings[1])
+
+    def test_columns(self) -> None:
+        """Test column access and dictionary encoding."""
+        store = CompactListings(self.listings)
+        self.assertEqual(store.column("make"),
+                         [i.make for i in self.listings])
+        self.assertEqual(store.column("price.amount_cents"),
+                         [i.price.amount_cents for i in self.listings])
+        self.assertEqual(store.column("auction"),
+                         [i.auction for i in self.listings])
+        with self.assertRaises(KeyError):
+            store.column("nothing")
+
+        table = InternTable()
+        self.assertEqual(table.encode("USD"), table.encode("US" + "D"))
+        self.assertEqual(table.encode(("a", "b")), 1)
+        self.assertEqual(table.decode(1), ("a", "b"))
+        self.assertEqual(len(table), 2)
+
+    def test_memory(self) -> None:
+        """Test that the compact store uses less memory than listings."""
+        listing_bytes, compact_bytes = measure_memory(self.data)
+        self.assertLess(compact_bytes, listing_bytes / 2)
@@ -0,0 +1,135 @@
+"""test_journal.py"""
+
+import json
+from typing import Any, List
+from unittest import mock
+from requests.exceptions import ConnectTimeout
+from services.scrapers.reverb.journal import CrawlJournal
+from services.scrapers.reverb.reverb import (category_uuids, new_crawl_id,
+                                             run_crawl, scrape_reverb)
+from services.scrapers.reverb.reverb_models import Listing
+from .helpers import TempDirTestCase, load_listings
+from .test_reverb import MockResponse
+
+
+def mocked_requests_get(*args: str, **kwargs: str) -> MockResponse:
+    """Return the electric guitars test page for any page request."""
+    if "?page=" not in args[0]:
+        return MockResponse({}, 200)
+    with open("./test/services/scrapers/reverb/"
+              "dumps/test_reverb_electric_guitars.json",
+              "r", encoding="utf-8") as infile:
+        data = json.loads(infile.read())
+    return MockResponse(data, 200)
+
+
+class CrawlJournalTests(TempDirTestCase):
+    """Test crawl checkpoint journals."""
+    URL = "https://api.reverb.com/api/"
+    listings: List[Listing] = load_listings()
+
+    def _journal(self, crawl_id: str = "crawl") -> CrawlJournal:
+        return CrawlJournal.for_crawl(self.directory, crawl_id,
+                                      "electric_guitars")
+
+    def test_record_and_reload(self) -> None:
+        """Test that progress survives reopening the journal."""
+        journal = self._journal()
+        with self.assertRaises(ValueError):
+            journal.record_page(1, self.listings[:2])
+        journal.start(4)
+        journal.record_page(2, self.listings[2:5])
+        journal.record_page(1, self.listings[:2])
+
+        journal = self._journal()
+        self.assertEqual(journal.total_pages, 4)
+        self.assertEqual(journal.completed_pages, {1, 2})
+        self.assertEqual(journal.listings(), self.listings[:5])
+
+        with self.assertRaises(ValueError):
+            CrawlJournal(journal.path, "other", "electric_guitars")
+
+    def test_remove(self) -> None:
+        """Test that a removed journal starts the crawl afresh."""
+        journal = self._journal()
+        journal.start(3)
+        journal.record_page(1, self.listings[:2])
+        journal.remove()
+        journal.remove()
+        self.assertFalse(journal.path.exists())
+        self.assertIsNone(journal.total_pages)
+        self.assertEqual(self._journal().completed_pages, set())
+        self.assertNotEqual(new_crawl_id(), new_crawl_id())
+
+    def test_truncated_record(self) -> None:
+        """Test that a partially written record is discarded."""
+        journal = self._journal()
+        journal.start(3)
+        journal.record_page(1, self.listings[:2])
+        with open(journal.path, "a", encoding="utf-8") as outfile:
+            outfile.write('{"type": "page", "page": 2, "listi')
+
+        journal = self._journal()
+        self.assertEqual(journal.completed_pages, {1})
+        journal.record_page(2, self.listings[2:3])
+        self.assertEqual(self._journal().completed_pages, {1, 2})
+        self.assertEqual(len(journal.listings()), 3)
+
+    @mock.patch("services.scrapers.reverb.reverb.requests.get",
+                side_effect=mocked_requests_get)
+    def test_resume_scrape(self, mock_get: mock.MagicMock) -> None:
+        """Test that a resumed scrape only fetches missing pages."""
+        journal = self._journal()
+        journal.start(4)
+        journal.record_page(2, self.listings[:1])
+
+        data = scrape_reverb(self.URL, "electric_guitars", journal=journal)
+        fetched: List[Any] = [i.args[0] for i in mock_get.call_args_list]
+        self.assertEqual([i.rsplit("=", 1)[-1] for i in fetched], ["1", "3"])
+        self.assertEqual(journal.completed_pages, {1, 2, 3})
+        self.assertIn(self.listings[0], data)
+
+        mock_get.reset_mock()
+        self.assertEqual(
+            scrape_reverb(self.URL, "electric_guitars", journal=journal),
+            data)
+        mock_get.assert_not_called()
+
+        fresh = scrape_reverb(self.URL, "electric_guitars", pages=2,
+                              journal=self._journal("fresh"))
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(len(fresh), len(data) - 1)
+
+    def test_resume_crawl(self) -> None:
+        """Test that a crawl interrupted in a later category resumes
+        without refetching the categories before it."""
+        electric = category_uuids["electric_guitars"]
+        down = [electric]
+
+        def get(url: str, **kwargs: str) -> MockResponse:
+            if "?page=" not in url:
+                return MockResponse({"total_pages": 100}, 200)
+            if any(i in url for i in down):
+                raise ConnectTimeout()
+            return mocked_requests_get(url)
+
+        with mock.patch("services.scrapers.reverb.reverb.requests.get",
+                        side_effect=get) as mock_get:
+            with self.assertRaises(SystemExit):
+                run_crawl("crawl", self.directory)
+            self.assertTrue(
+                (self.directory / "reverb_acoustic_guitars.json").exists())
+            self.assertEqual(len(list((self.directory / "journal").iterdir())),
+                             2)
+
+            down.clear()
+            mock_get.reset_mock()
+            scrapes = run_crawl("crawl", self.directory)
+
+        fetched: List[Any] = [i.args[0] for i in mock_get.call_args_list]
+        self.assertEqual(fetched, [f"{self.URL}categories/{electric}?page=1"])
+        self.assertEqual(len(scrapes["acoustic_guitars"]),
+                         len(scrapes["electric_guitars"]))
+        self.assertTrue(
+            (self.directory / "reverb_electric_guitars.json").exists())
+        self.assertEqual(list((self.directory / "journal").iterdir()), [])
@@ -0,0 +1,118 @@
+"""test_matching.py"""
+
+import unittest
+from datetime import datetime, timezone
+from typing import List
+from sqlalchemy import text
+from sqlmodel import SQLModel, Session, create_engine
+from db.crud import get_user_by_email, get_user_feed
+from db.models import Instrument, User
+from services.scrapers.reverb.matching import instrument_type, record_matches
+from services.scrapers.reverb.reverb_models import Listing
+from .helpers import load_listings
+
+
+class MatchingTests(unittest.TestCase):
+    """Test the materialized user listing match feed."""
+
+    listings: List[Listing] = load_listings()
+
+    def setUp(self) -> None:
+        """Set up sqlite database with users searching for guitars."""
+        self.engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(self.engine)
+        now = datetime.now(timezone.utc)
+        with Session(self.engine) as session:
+            gibson = Instrument(type="electric_guitar", make="Gibson",
+                                model="", date_created=now)
+            fender = Instrument(type="electric_guitar", make="Fender",
+                                model="strat", date_created=now)
+            acoustic = Instrument(type="acoustic_guitar", make="Fender",
+                                  model="", date_created=now)
+            session.add(User(email="david@test.com", active=True,
+                             date_created=now,
+                             instruments=[gibson, fender]))
+            session.add(User(email="john@test.com", active=True,
+                             date_created=now,
+                             instruments=[gibson, acoustic]))
+            session.commit()
+
+    def _feed(self, email: str, limit: int = 50) -> List[int]:
+        user = get_user_by_email(email, self.engine)
+        assert user is not None
+        listing_ids: List[int] = []
+        before_id = None
+        while True:
+            page = get_user_feed(user, self.engine, limit, before_id)
+            if not page:
+                return listing_ids
+            listing_ids += [i.listing_id for i in page]
+            before_id = page[-1].id
+
+    def test_instrument_type(self) -> None:
+        """Test category to instrument type mapping."""
+        self.assertEqual(instrument_type("electric_guitars"),
+                         "electric_guitar")
+        self.assertEqual(instrument_type("guitar_synth"), "guitar_synth")
+
+    def test_record_matches(self) -> None:
+        """Test matches are recorded once and paged newest first."""
+        gibsons = [i for i in self.listings if i.make == "Gibson"]
+        strats = [i for i in self.listings
+                  if i.make == "Fender" and "strat" in i.model.lower()]
+        self.assertTrue(strats)
+
+        added = record_matches(self.listings, "electric_guitars",
+                               self.engine, "crawl", batch_size=7)
+        self.assertEqual(added, 2 * len(gibsons) + len(strats))
+        self.assertEqual(record_matches(self.listings, "electric_guitars",
+                                        self.engine), 0)
+        self.assertEqual(record_matches(self.listings, "acoustic_guitars",
+                                        self.engine),
+                         len([i for i in self.listings
+                              if i.make == "Fender"]))
+
+        newest_first = sorted(
+            gibsons + strats,
+            key=lambda listing: datetime.strptime(listing.published_at,
+                                                  "%Y-%m-%dT%H:%M:%S%z"),
+            reverse=True)
+        self.assertEqual(self._feed("david@test.com", limit=2),
+                         [i.id for i in newest_first])
+
+    def test_make_ignores_case(self) -> None:
+        """Test makes match regardless of case."""
+        with Session(self.engine) as session:
+            session.add(User(email="lower@test.com", active=True,
+                             date_created=datetime.now(timezone.utc),
+                             instruments=[Instrument(
+                                 type="electric_guitar", make="gibson",
+                                 model="", date_created=datetime.now(
+                                     timezone.utc))]))
+            session.commit()
+        record_matches(self.listings, "electric_guitars", self.engine)
+        self.assertEqual(len(self._feed("lower@test.com")),
+                         len([i for i in self.listings
+                              if i.make == "Gibson"]))
+
+    def test_make_lookup_uses_index(self) -> None:
+        """Test the case-insensitive make lookup is served by the
+        expression index on both columns."""
+        with Session(self.engine) as session:
+            plan = session.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM instrument "
+                "WHERE type = 'electric_guitar' "
+                "AND lower(make) IN ('gibson', 'fender')")).all()
+        detail = " ".join(str(i) for i in plan)
+        self.assertIn("ix_instrument_type_lower_make (type=? AND <expr>=?)",
+                      detail)
+
+    def test_feed_uses_index(self) -> None:
+        """Test the keyset feed query is served by the composite index."""
+        with Session(self.engine) as session:
+            plan = session.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM userlistingmatch "
+                "WHERE user_id = 1 AND id < 100 ORDER BY id DESC LIMIT 50"
+            )).all()
+        self.assertIn("ix_userlistingmatch_user_id_id",
+                      " ".join(str(i) for i in plan))
@@ -4,7 +4,7 @@ import unittest
 import json
 from pathlib import Path
 from io import StringIO
-from typing import List, Dict, Collection, Union
+from typing import Any, List, Dict, Optional, Union
 from unittest import mock
 from services.scrapers.reverb.reverb import scrape_reverb, dump_scrape
 from services.scrapers.reverb.reverb_models import Listing
@@ -15,13 +15,15 @@ class MockResponse:
     """Mock API responses."""
 
     def __init__(self,
-                 response_data: Union[str, Dict[str, Collection[str]]],
-                 status_code: int) -> None:
+                 response_data: Union[str, Dict[str, Any]],
+                 status_code: int,
+                 headers: Optional[Dict[str, str]] = None) -> None:
         self.response_data = response_data
         self.status_code = status_code
         self.text = response_data
+        self.headers = headers or {}
 
-    def json(self) -> Union[str, Dict[str, Collection[str]]]:
+    def json(self) -> Union[str, Dict[str, Any]]:
         """Mock requests.Models.Response.json method"""
         return self.response_data
 
@@ -0,0 +1,222 @@
+"""test_work_queue.py"""
+
+import json
+from json import JSONDecodeError
+from threading import Lock, Thread
+from time import sleep
+from typing import Collection, Dict, List
+from unittest import mock
+import requests
+from sqlmodel import Session, SQLModel, create_engine, select
+from db.models import CrawlTask
+from services.scrapers.reverb.reverb import category_uuids
+from services.scrapers.reverb.reverb_models import Listing
+from services.scrapers.reverb.work_queue import (
+    enqueue_crawl, lease_task, complete_task, fail_task, crawl_progress,
+    run_worker, collect_results, dump_crawl)
+from services.scrapers.reverb.queue_benchmark import run_benchmark
+from .helpers import TempDirTestCase, load_listings
+from .test_reverb import MockResponse
+
+CRAWL = "crawl"
+ELECTRIC = "electric_guitars"
+
+
+class WorkQueueTests(TempDirTestCase):
+    """Test the crawl work queue."""
+    listings: List[Listing] = load_listings()
+
+    def setUp(self) -> None:
+        """Set up a file backed sqlite work queue."""
+        super().setUp()
+        self.engine = create_engine(
+            f"sqlite:///{self.directory / 'queue.db'}",
+            connect_args={"check_same_thread": False, "timeout": 30})
+        self.addCleanup(self.engine.dispose)
+        SQLModel.metadata.create_all(self.engine)
+        self.fetched: List[int] = []
+        self.lock = Lock()
+
+    def _fetch(self, uuid: str, page: int) -> List[Listing]:
+        """Fake page fetcher returning one listing per page."""
+        self.assertEqual(uuid, category_uuids[ELECTRIC])
+        sleep(0.01)
+        with self.lock:
+            self.fetched.append(page)
+        return self.listings[page - 1:page]
+
+    def test_enqueue_and_lease(self) -> None:
+        """Test that enqueueing is idempotent and leases are exclusive
+        until they expire."""
+        self.assertEqual(enqueue_crawl(CRAWL, ELECTRIC, 3, self.engine), 2)
+        self.assertEqual(enqueue_crawl(CRAWL, ELECTRIC, 4, self.engine), 1)
+
+        first = lease_task("a", self.engine)
+        second = lease_task("b", self.engine)
+        assert first is not None and second is not None
+        self.assertEqual((first.page, second.page), (1, 2))
+        self.assertEqual(first.worker_id, "a")
+
+        expired = lease_task("c", self.engine, lease_seconds=-1)
+        assert expired is not None
+        self.assertEqual(expired.page, 3)
+        stolen = lease_task("d", self.engine)
+        assert stolen is not None
+        self.assertEqual((stolen.page, stolen.attempts), (3, 2))
+        self.assertIsNone(lease_task("e", self.engine))
+
+        self.assertFalse(complete_task(expired, "c", [], self.engine))
+        self.assertTrue(complete_task(stolen, "d", self.listings[:1],
+                                      self.engine))
+        self.assertEqual(crawl_progress(CRAWL, self.engine),
+                         {"pending": 0, "leased": 2, "done": 1,
+                          "failed": 0, "total": 3})
+
+    def test_fail_task(self) -> None:
+        """Test that failed tasks are retried up to max_attempts."""
+        enqueue_crawl(CRAWL, ELECTRIC, 2, self.engine)
+        for attempt in range(1, 3):
+            task = lease_task("a", self.engine)
+            assert task is not None
+            self.assertEqual(task.attempts, attempt)
+            self.assertTrue(fail_task(task, "a", "boom", self.engine,
+                                      max_attempts=2))
+        self.assertIsNone(lease_task("a", self.engine))
+        with Session(self.engine) as session:
+            task = session.exec(select(CrawlTask)).one()
+        self.assertEqual((task.status, task.error), ("failed", "boom"))
+
+    def test_workers(self) -> None:
+        """Test that concurrent workers fetch every page exactly once."""
+        enqueue_crawl(CRAWL, ELECTRIC, 21, self.engine)
+        enqueue_crawl("other", ELECTRIC, 5, self.engine)
+        counts: List[int] = []
+
+        def work(worker_id: str) -> None:
+            completed = run_worker(worker_id, self.engine, self._fetch,
+                                   poll_interval=0.01)
+            with self.lock:
+                counts.append(completed)
+
+        threads = [Thread(target=work, args=(f"w{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(counts), 24)
+        self.assertEqual(sorted(self.fetched),
+                         sorted(list(range(1, 21)) + list(range(1, 5))))
+        self.assertEqual(crawl_progress(CRAWL, self.engine)["done"], 20)
+
+        data = collect_results(CRAWL, ELECTRIC, self.engine)
+        self.assertCountEqual([i.id for i in data],
+                              [i.id for i in self.listings[:20]])
+        self.assertEqual(collect_results(CRAWL, "acoustic_guitars",
+                                         self.engine), [])
+
+    def test_dump_crawl(self) -> None:
+        """Test that only complete crawls are dumped unless forced."""
+        with self.assertRaises(ValueError):
+            dump_crawl(CRAWL, self.engine, self.directory)
+        enqueue_crawl(CRAWL, ELECTRIC, 3, self.engine)
+        task = lease_task("a", self.engine)
+        assert task is not None
+        complete_task(task, "a", self.listings[:1], self.engine)
+        dump = self.directory / f"reverb_{ELECTRIC}.json"
+
+        with self.assertRaises(ValueError):
+            dump_crawl(CRAWL, self.engine, self.directory)
+        self.assertFalse(dump.exists())
+        scrapes = dump_crawl(CRAWL, self.engine, self.directory, force=True)
+        self.assertEqual(len(scrapes[ELECTRIC]), 1)
+
+        run_worker("a", self.engine, self._fetch)
+        scrapes = dump_crawl(CRAWL, self.engine, self.directory)
+        self.assertEqual(len(scrapes[ELECTRIC]), 2)
+        with open(dump, "r", encoding="utf-8") as infile:
+            self.assertEqual(len(json.load(infile)), 2)
+
+    def test_worker_errors(self) -> None:
+        """Test that fetch errors are recorded against the task."""
+        enqueue_crawl(CRAWL, ELECTRIC, 2, self.engine)
+
+        def fetch(uuid: str, page: int) -> List[Listing]:
+            raise SystemExit("Request has timed out")
+
+        self.assertEqual(run_worker("a", self.engine, fetch), 0)
+        self.assertEqual(crawl_progress(CRAWL, self.engine)["failed"], 1)
+
+        errors: List[Exception] = [requests.ConnectionError("refused"),
+                                   requests.ReadTimeout("slow"),
+                                   JSONDecodeError("Expecting value", "", 0)]
+
+        def flaky(uuid: str, page: int) -> List[Listing]:
+            raise errors.pop(0)
+
+        enqueue_crawl("flaky", ELECTRIC, 2, self.engine)
+        self.assertEqual(run_worker("b", self.engine, flaky), 0)
+        self.assertEqual(errors, [])
+        with Session(self.engine) as session:
+            task = session.exec(select(CrawlTask)
+                                .where(CrawlTask.crawl_id == "flaky")).one()
+        self.assertEqual((task.status, task.attempts), ("failed", 3))
+        self.assertEqual(task.error, "JSONDecodeError: Expecting value: "
+                                     "line 1 column 1 (char 0)")
+
+    def test_expired_lease_attempts(self) -> None:
+        """Test that a task whose workers keep dying is failed."""
+        enqueue_crawl(CRAWL, ELECTRIC, 2, self.engine)
+        for worker in ("a", "b"):
+            task = lease_task(worker, self.engine, lease_seconds=-1,
+                              max_attempts=2)
+            assert task is not None
+        self.assertIsNone(lease_task("c", self.engine, max_attempts=2))
+        with Session(self.engine) as session:
+            task = session.exec(select(CrawlTask)).one()
+        self.assertEqual(task.status, "failed")
+        self.assertEqual(task.error,
+                         "Lease expired after 2 attempts, last held by b")
+
+    def test_rate_limit(self) -> None:
+        """Test that rate limited fetches are retried after a backoff
+        without counting as attempts."""
+        enqueue_crawl(CRAWL, ELECTRIC, 2, self.engine)
+        with open("./test/services/scrapers/reverb/dumps/"
+                  "test_reverb_electric_guitars.json",
+                  "r", encoding="utf-8") as infile:
+            page = json.load(infile)
+        too_many: Dict[str, Collection[str]] = {
+            "message": "Too many requests"}
+        responses = [MockResponse(too_many, 429),
+                     MockResponse(too_many, 429, {"Retry-After": "0.02"}),
+                     MockResponse(page, 200)]
+
+        with mock.patch("services.scrapers.reverb.reverb.requests.get",
+                        side_effect=responses) as get:
+            completed = run_worker("a", self.engine, poll_interval=0.01,
+                                   backoff=0.01)
+
+        self.assertEqual((completed, get.call_count), (1, 3))
+        with Session(self.engine) as session:
+            task = session.exec(select(CrawlTask)).one()
+        self.assertEqual((task.status, task.attempts), ("done", 1))
+        self.assertEqual(len(collect_results(CRAWL, ELECTRIC, self.engine)),
+                         len(page["listings"]))
+
+
+class QueueBenchmarkTests(TempDirTestCase):
+    """Test the work queue throughput benchmark."""
+
+    def test_run_benchmark(self) -> None:
+        """Test that more workers drain the queue faster."""
+        url = f"sqlite:///{self.directory / 'queue.db'}"
+        results = run_benchmark(url, (1, 4), pages=20, latency=0.02)
+        self.assertEqual(list(results), [1, 4])
+        self.assertGreater(results[4], results[1] * 2)
+
+        engine = create_engine(url)
+        self.addCleanup(engine.dispose)
+        enqueue_crawl(CRAWL, ELECTRIC, 2, engine)
+        with self.assertRaises(ValueError):
+            run_benchmark(url, (1,), pages=1, latency=0)